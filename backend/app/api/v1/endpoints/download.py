@@ -1,15 +1,22 @@
 # backend/app/api/v1/endpoints/download.py
-from fastapi import APIRouter, HTTPException, Request, Response, status
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import RedirectResponse, StreamingResponse
+from app.core.config import settings
 from app.core.database import prisma
 from app.core.security import security
+from app.core.rate_limit import rate_limit
+from app.core.pubsub import event_hub, user_channel
 from app.core.storage import storage
+from app.services.id_filter import id_filter
+from app.services.share_cache import share_cache
 from app.schemas.request import RequestStatus
 from app.schemas.file import FileStatus
 import logging
-from typing import AsyncGenerator
-import aioboto3
+from typing import AsyncGenerator, Optional
+import asyncio
 import urllib.parse
+from collections import deque
+from datetime import datetime, timezone
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -30,26 +37,260 @@ def encode_filename_for_download(filename: str) -> str:
         return f"attachment; filename*=UTF-8''{encoded_filename}"
 
 
-async def stream_file_from_r2(bucket_name: str, key: str) -> AsyncGenerator[bytes, None]:
-    """R2からファイルをストリーミング"""
-    session = aioboto3.Session()
-    async with session.client(
-        's3',
-        endpoint_url=storage.endpoint,
-        aws_access_key_id=storage.access_key_id,
-        aws_secret_access_key=storage.secret_access_key,
-        region_name='auto'
-    ) as client:
-        try:
-            response = await client.get_object(Bucket=bucket_name, Key=key)
-            async for chunk in response['Body'].iter_chunks():
+def file_etag(file) -> str:
+    """
+    ダウンロード用の強いETag
+
+    アップロード完了後のファイル内容は変わらないため、ファイルIDとサイズから生成する
+    """
+    return f'"{file.id}-{file.size}"'
+
+
+def parse_range_header(range_header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """
+    Rangeヘッダーを解析し、(開始位置, 終了位置)を返す（終了位置を含む）
+
+    - 単一のバイト範囲のみ対応し、複数範囲や不正な形式の場合はNone（全体を返す）
+    - 範囲がファイルサイズを満たせない場合は416を送出
+    """
+    if not range_header:
+        return None
+    
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    
+    start_text, sep, end_text = ranges.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+        else:
+            # bytes=-N は末尾Nバイト
+            suffix_length = int(end_text)
+            if suffix_length <= 0:
+                raise ValueError
+            start = max(size - suffix_length, 0)
+            end = size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    if start < 0 or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+async def stream_file_from_r2(
+    bucket_name: str,
+    key: str,
+    byte_range: Optional[tuple[int, int]] = None
+) -> AsyncGenerator[bytes, None]:
+    """R2からファイルをストリーミング（プール済みクライアントを使用、byte_rangeで部分取得）"""
+    client = await storage.get_client()
+    params = {"Bucket": bucket_name, "Key": key}
+    if byte_range:
+        params["Range"] = f"bytes={byte_range[0]}-{byte_range[1]}"
+    try:
+        response = await asyncio.wait_for(
+            client.get_object(**params),
+            timeout=storage.operation_timeout
+        )
+        async with response['Body'] as body:
+            async for chunk in body.iter_chunks():
                 yield chunk
-        except Exception as e:
-            logger.error(f"Failed to stream file from R2: {e}")
-            raise
+    except Exception as e:
+        logger.error(f"Failed to stream file from R2: {e}")
+        raise
 
 
-@router.get("/{request_id}/file", operation_id="download_file")
+def _chunk_ranges(chunks: list, byte_range: Optional[tuple[int, int]]) -> list[tuple[str, Optional[tuple[int, int]], int]]:
+    """
+    ファイル上のバイト範囲をチャンクごとの(キー, チャンク内の範囲, バイト数)に変換
+
+    チャンク全体を含む場合、チャンク内の範囲はNone
+    """
+    total_size = sum(chunk.size for chunk in chunks)
+    start, end = byte_range or (0, total_size - 1)
+    
+    ranges = []
+    offset = 0
+    for chunk in chunks:
+        chunk_start, chunk_end = offset, offset + chunk.size - 1
+        offset += chunk.size
+        if chunk_end < start or chunk_start > end:
+            continue
+        first = max(start, chunk_start) - chunk_start
+        last = min(end, chunk_end) - chunk_start
+        part_range = None if first == 0 and last == chunk.size - 1 else (first, last)
+        ranges.append((chunk.r2Key, part_range, last - first + 1))
+    return ranges
+
+
+async def stream_chunks_from_r2(
+    chunks: list,
+    byte_range: Optional[tuple[int, int]] = None
+) -> AsyncGenerator[bytes, None]:
+    """
+    チャンクオブジェクトをchunkIndex順に連結し、1つのファイルとしてストリーミング
+
+    後続のチャンクを並行して先読みする。先読み数はDOWNLOAD_PREFETCH_CHUNKS以下で、
+    送信中のチャンクを含めた保持量がDOWNLOAD_PREFETCH_MEMORYを超えないように制限する
+    """
+    ranges = _chunk_ranges(chunks, byte_range)
+    if not ranges:
+        return
+    
+    largest = max(length for _, _, length in ranges)
+    prefetch = max(1, min(
+        settings.DOWNLOAD_PREFETCH_CHUNKS,
+        settings.DOWNLOAD_PREFETCH_MEMORY // largest - 1
+    ))
+    
+    pending: deque[asyncio.Task] = deque()
+    next_index = 0
+    try:
+        while pending or next_index < len(ranges):
+            while next_index < len(ranges) and len(pending) < prefetch:
+                key, part_range, _ = ranges[next_index]
+                pending.append(asyncio.create_task(storage.download_chunk(key, part_range)))
+                next_index += 1
+            
+            data = await pending.popleft()
+            if data is None:
+                raise RuntimeError("Failed to download chunk from R2")
+            yield data
+            data = None
+    except Exception as e:
+        logger.error(f"Failed to stream chunks from R2: {e}")
+        raise
+    finally:
+        # クライアント切断時などは先読み中のダウンロードを中止
+        for task in pending:
+            task.cancel()
+
+
+# キャッシュ無効化ヘッダー
+NO_CACHE_HEADERS = {
+    "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
+    "Pragma": "no-cache",
+    "Expires": "0"
+}
+
+
+def _redirect_response(file) -> RedirectResponse:
+    """
+    R2の署名付きGET URLへリダイレクト（redirectモード）
+
+    ファイルはクライアント側で暗号化済みのため、短時間有効な単一オブジェクトのURLを渡し、
+    バイト列はAPIを経由せずR2から直接取得させる。RangeヘッダーはR2側で処理される
+    """
+    url = storage.presign_many(
+        [file.r2Key],
+        operation='get_object',
+        expires_in=settings.DOWNLOAD_URL_EXPIRES_SECONDS,
+        params={
+            'ResponseContentDisposition': encode_filename_for_download(file.filename),
+            'ResponseContentType': file.mimeType
+        }
+    )[0]
+    return RedirectResponse(url, status_code=status.HTTP_302_FOUND, headers=NO_CACHE_HEADERS)
+
+
+def _redirects(file) -> bool:
+    """署名付きURLへリダイレクトして配信するか（結合済みオブジェクトを持たないファイルは常にストリーミング）"""
+    return bool(file.r2Key) and settings.DOWNLOAD_MODE == "redirect"
+
+
+async def _file_response(file, etag: str, byte_range: Optional[tuple[int, int]]) -> Response:
+    """
+    ファイル全体（200）または指定範囲（206）のレスポンスを作成
+
+    結合済みオブジェクトを持たない（r2Keyが空の）ファイルはチャンクを連結して配信する
+    """
+    if _redirects(file):
+        return _redirect_response(file)
+    
+    headers = {
+        "Content-Disposition": encode_filename_for_download(file.filename),
+        "Content-Length": str(file.size),
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        **NO_CACHE_HEADERS
+    }
+    status_code = status.HTTP_200_OK
+    if byte_range:
+        start, end = byte_range
+        headers["Content-Length"] = str(end - start + 1)
+        headers["Content-Range"] = f"bytes {start}-{end}/{file.size}"
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+    
+    if file.r2Key:
+        content = stream_file_from_r2(storage.bucket_name, file.r2Key, byte_range)
+    else:
+        chunks = await prisma.filechunk.find_many(
+            where={"fileId": file.id},
+            order={"chunkIndex": "asc"}
+        )
+        content = stream_chunks_from_r2(chunks, byte_range)
+    
+    return StreamingResponse(
+        content,
+        status_code=status_code,
+        media_type=file.mimeType,
+        headers=headers
+    )
+
+
+async def _record_download(file, access_request, ip_hash: str):
+    """
+    ダウンロードログを記録し、リクエストの初回ダウンロードであればユニークダウンロード数を加算
+
+    並行したダウンロードで上限を超えないよう、加算は上限未満の場合のみ行う条件付き更新とし、
+    上限に達していた場合はトランザクションごとロールバックして410を返す
+    """
+    counted = 0
+    async with prisma.tx() as transaction:
+        if not access_request.firstDownloadedAt:
+            # 初回ダウンロードの確定（並行した同一リクエストのうち1つだけが成功する）
+            claimed = await transaction.accessrequest.update_many(
+                where={"id": access_request.id, "firstDownloadedAt": None},
+                data={"firstDownloadedAt": datetime.now(timezone.utc)}
+            )
+            if claimed:
+                counted = await transaction.execute_raw(
+                    """
+                    UPDATE "File"
+                    SET "uniqueDownloadCount" = "uniqueDownloadCount" + 1
+                    WHERE "id" = $1 AND "uniqueDownloadCount" < "maxDownloads"
+                    """,
+                    file.id
+                )
+                if not counted:
+                    logger.warning(f"File {file.id} download limit exceeded by concurrent downloads")
+                    raise HTTPException(
+                        status_code=status.HTTP_410_GONE,
+                        detail="Download limit exceeded"
+                    )
+        
+        await transaction.downloadlog.create({
+            "fileId": file.id,
+            "requestId": access_request.id,  # AccessRequestテーブルのprimary key
+            "ipHash": ip_hash
+        })
+    
+    # ダウンロード数が変わったため共有情報のキャッシュを削除
+    if counted:
+        await share_cache.invalidate(file.shareId)
+
+
+@router.get("/{request_id}/file", operation_id="download_file", dependencies=[Depends(rate_limit("download_file"))])
 async def download_file(request_id: str, req: Request):
     """
     承認されたリクエストでファイルをダウンロード
@@ -57,11 +298,16 @@ async def download_file(request_id: str, req: Request):
     - リクエストIDで認証
     - ダウンロード回数制限チェック
     - ストリーミングレスポンス
+    - Range / If-Range による部分取得（中断したダウンロードの再開）
+    - DOWNLOAD_MODE=redirect の場合はアクセスチェックと記録のみ行い、署名付きURLへリダイレクト
     """
     try:
         # リクエストを取得
-        access_request = await prisma.accessrequest.find_unique(
-            where={"requestId": request_id}
+        # 存在しないIDはBloomフィルター・ネガティブキャッシュでDB検索前に除外
+        access_request = await id_filter.lookup(
+            "request",
+            request_id,
+            lambda: prisma.accessrequest.find_unique(where={"requestId": request_id})
         )
         
         if not access_request:
@@ -79,8 +325,7 @@ async def download_file(request_id: str, req: Request):
         
         # ファイル情報を最新の状態で取得
         file = await prisma.file.find_unique(
-            where={"id": access_request.fileId},
-            include={"chunks": True}
+            where={"id": access_request.fileId}
         )
         
         if not file:
@@ -112,14 +357,25 @@ async def download_file(request_id: str, req: Request):
                 detail="File has expired"
             )
         
-        # ダウンロード回数チェック（ユニークなリクエストID数で制限）
-        download_logs = await prisma.downloadlog.find_many(
-            where={"fileId": file.id}
-        )
-        unique_request_count = len(set(log.requestId for log in download_logs))
-        logger.info(f"File {file.id} unique request count: {unique_request_count}/{file.maxDownloads}")
-        if unique_request_count >= file.maxDownloads:
-            logger.warning(f"File {file.id} download limit exceeded: {unique_request_count}/{file.maxDownloads}")
+        # Rangeヘッダーの解析（If-RangeのETagが一致しない場合は全体を返す）
+        # リダイレクトする場合はIf-RangeはR2のETagに対してR2側で評価される
+        etag = file_etag(file)
+        if_range = req.headers.get("if-range")
+        byte_range = None
+        if _redirects(file) or if_range is None or if_range.strip() == etag:
+            byte_range = parse_range_header(req.headers.get("range"), file.size)
+        
+        # 同じリクエストで既にダウンロードを開始している場合、範囲指定は中断したダウンロードの再開とみなし、
+        # 新たなダウンロードとして記録・カウントしない
+        if byte_range and access_request.firstDownloadedAt:
+            logger.info(f"Resuming download of file {file.id} for request {access_request.requestId}: bytes {byte_range[0]}-{byte_range[1]}")
+            return await _file_response(file, etag, byte_range)
+        
+        # ダウンロード回数チェック（ダウンロードしたユニークなリクエスト数で制限）
+        # 新しいリクエストの場合は記録時の条件付き更新でも上限を確認する
+        logger.info(f"File {file.id} unique request count: {file.uniqueDownloadCount}/{file.maxDownloads}")
+        if file.uniqueDownloadCount >= file.maxDownloads:
+            logger.warning(f"File {file.id} download limit exceeded: {file.uniqueDownloadCount}/{file.maxDownloads}")
             raise HTTPException(
                 status_code=status.HTTP_410_GONE,
                 detail="Download limit exceeded"
@@ -129,34 +385,22 @@ async def download_file(request_id: str, req: Request):
         client_ip = req.client.host
         ip_hash = security.hash_ip(client_ip)
         
-        # ダウンロードログを記録
-        await prisma.downloadlog.create({
-            "fileId": file.id,
-            "requestId": access_request.id,  # AccessRequestテーブルのprimary key
-            "ipHash": ip_hash
-        })
+        # ダウンロードを記録（初回の場合はユニークダウンロード数を加算）
+        await _record_download(file, access_request, ip_hash)
         
         logger.info(f"Download log created for file {file.id}, request {access_request.requestId}")
         
-        # チャンクが存在する場合は結合してストリーミング
-        if file.chunks:
-            # TODO: 複数チャンクの結合処理を実装
-            # 現在は単一ファイルとして扱う
-            pass
+        # ファイル所有者に通知
+        if file.userId:
+            await event_hub.publish(user_channel(file.userId), "download_started", {
+                "file_id": file.id,
+                "filename": file.filename,
+                "request_id": access_request.requestId,
+                "started_at": datetime.now(timezone.utc)
+            })
         
         # ファイルをストリーミング
-        return StreamingResponse(
-            stream_file_from_r2(storage.bucket_name, file.r2Key),
-            media_type=file.mimeType,
-            headers={
-                "Content-Disposition": encode_filename_for_download(file.filename),
-                "Content-Length": str(file.size),
-                # キャッシュ無効化ヘッダー
-                "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
-                "Pragma": "no-cache",
-                "Expires": "0"
-            }
-        )
+        return await _file_response(file, etag, byte_range)
         
     except HTTPException:
         raise
@@ -168,7 +412,7 @@ async def download_file(request_id: str, req: Request):
         )
 
 
-@router.post("/{request_id}/decrypt-key", operation_id="get_decrypt_key")
+@router.post("/{request_id}/decrypt-key", operation_id="get_decrypt_key", dependencies=[Depends(rate_limit("get_decrypt_key"))])
 async def get_decrypt_key(request_id: str, response: Response):
     """
     承認されたリクエストで復号化キーを取得
@@ -178,8 +422,11 @@ async def get_decrypt_key(request_id: str, response: Response):
     """
     try:
         # リクエストを取得
-        access_request = await prisma.accessrequest.find_unique(
-            where={"requestId": request_id}
+        # 存在しないIDはBloomフィルター・ネガティブキャッシュでDB検索前に除外
+        access_request = await id_filter.lookup(
+            "request",
+            request_id,
+            lambda: prisma.accessrequest.find_unique(where={"requestId": request_id})
         )
         
         if not access_request:
@@ -1,33 +1,138 @@
 # backend/app/api/v1/endpoints/files.py
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, Path, Request, status, Depends, Query
 from app.schemas.file import (
     InitiateUploadRequest,
     InitiateUploadResponse,
+    ChunkUrlsResponse,
     ChunkUploadRequest,
     ChunkUploadResponse,
+    PartUploadedRequest,
     CompleteUploadRequest,
     FileInfoResponse,
     FileStatus,
     RecentFilesResponse,
     RecentFileItem,
-    FileUpdateRequest
+    FileUpdateRequest,
+    UploadMode
 )
 from app.schemas.auth import AuthUser
 from app.core.database import prisma
 from app.core.security import security
-from app.core.storage import storage
+from app.core.storage import storage, MIN_PART_SIZE, MAX_PARTS
 from app.core.config import settings
 from app.core.auth import require_auth
-from datetime import datetime, timezone
+from app.core.pagination import cached_total, decode_cursor, encode_cursor
+from app.services.id_filter import id_filter
+from app.services.share_cache import share_cache
+from app.services.upload_session import (
+    upload_session_service,
+    ChunkTarget,
+    UploadSessionInfo,
+    UploadSessionUnavailable,
+    TRACKER_DATABASE,
+    TRACKER_REDIS
+)
+from typing import Awaitable, BinaryIO, Callable, Optional
 import base64
+import dataclasses
 import json
 import math
+import tempfile
+import uuid
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+async def _get_active_session(session_key: str) -> UploadSessionInfo:
+    """有効なアップロードセッションを取得（無効・期限切れの場合は例外）"""
+    session = await upload_session_service.get_active(session_key)
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Invalid or expired session"
+        )
+    
+    # 有効期限チェック
+    if security.is_expired(session.expires_at):
+        await upload_session_service.update_status(session, "expired")
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Upload session expired"
+        )
+    
+    return session
+
+
+def _presign_chunk_urls(file_id: str, metadata: dict, start: int, end: int) -> list[str]:
+    """チャンクインデックス[start, end)のアップロード用署名付きURLを生成"""
+    if metadata.get("upload_mode") == UploadMode.MULTIPART:
+        # パート番号は1始まり
+        return storage.presign_upload_parts(
+            security.generate_r2_key(file_id),
+            metadata["upload_id"],
+            range(start + 1, end + 1),
+            expires_in=settings.CHUNK_URL_EXPIRES_SECONDS
+        )
+    return storage.presign_many(
+        [security.generate_r2_key(file_id, i) for i in range(start, end)],
+        operation='put_object',
+        expires_in=settings.CHUNK_URL_EXPIRES_SECONDS
+    )
+
+
+async def _create_upload_records(
+    request: InitiateUploadRequest,
+    current_user: AuthUser,
+    file_id: str,
+    share_id: str,
+    session: UploadSessionInfo,
+    r2_keys: list[str]
+):
+    """ファイル・アップロードセッション・チャンクのレコードを1トランザクションで作成"""
+    async with prisma.tx() as transaction:
+        # ファイルレコードを作成（ユーザーIDを関連付け）
+        await transaction.file.create({
+            "id": file_id,
+            "shareId": share_id,
+            "filename": request.filename,
+            "size": request.size,
+            "mimeType": request.mime_type,
+            "encryptedKey": "",  # 後で更新
+            "r2Key": "",  # 後で更新
+            "uploadStatus": FileStatus.UPLOADING.value,
+            "chunkCount": len(r2_keys),
+            "uploadedChunks": 0,
+            "expiresAt": security.calculate_expiry(request.expires_in_hours),
+            "maxDownloads": request.max_downloads,
+            "userId": current_user.id  # 認証済みユーザーのIDを設定
+        })
+        
+        # アップロードセッションを作成
+        await transaction.uploadsession.create({
+            "id": session.id,
+            "sessionKey": session.session_key,
+            "fileId": file_id,
+            "status": "active",
+            "expiresAt": session.expires_at,
+            "metadata": json.dumps(session.metadata)
+        })
+        
+        # チャンクレコードを一括作成
+        await transaction.filechunk.create_many(
+            data=[
+                {
+                    "fileId": file_id,
+                    "chunkIndex": i,
+                    "size": min(request.chunk_size, request.size - i * request.chunk_size),
+                    "r2Key": r2_key
+                }
+                for i, r2_key in enumerate(r2_keys)
+            ]
+        )
+
+
 @router.post("/upload/initiate", response_model=InitiateUploadResponse, operation_id="initiate_upload")
 async def initiate_upload(
     request: InitiateUploadRequest,
@@ -36,9 +141,9 @@ async def initiate_upload(
     """
     ファイルアップロードを開始
     
-    1. ファイルレコードを作成
-    2. アップロードセッションを作成
-    3. チャンク用の署名付きURLを生成
+    1. multipartモードの場合はR2のマルチパートアップロードを開始
+    2. ファイル・アップロードセッション・チャンクのレコードを一括作成
+    3. 先頭ウィンドウ分のチャンク用署名付きURLを生成
     """
     try:
         # ファイルサイズチェック
@@ -51,65 +156,91 @@ async def initiate_upload(
         # チャンク数を計算
         chunk_count = math.ceil(request.size / request.chunk_size)
         
-        # 共有IDとセッションキーを生成
+        # multipartモードではチャンクがそのままパートになるため、S3のパート制約を満たす必要がある
+        if request.upload_mode == UploadMode.MULTIPART:
+            if chunk_count > 1 and request.chunk_size < MIN_PART_SIZE:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Chunk size must be at least {MIN_PART_SIZE} bytes in multipart mode"
+                )
+            if chunk_count > MAX_PARTS:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Chunk count must not exceed {MAX_PARTS} in multipart mode"
+                )
+        
+        # ファイルID・共有ID・セッションキーを生成
+        file_id = str(uuid.uuid4())
         share_id = security.generate_share_id()
         session_key = security.generate_session_key()
         
-        # ファイルレコードを作成（ユーザーIDを関連付け）
-        file = await prisma.file.create({
-            "shareId": share_id,
-            "filename": request.filename,
+        metadata = {
+            "chunk_size": request.chunk_size,
+            "total_chunks": chunk_count,
             "size": request.size,
-            "mimeType": request.mime_type,
-            "encryptedKey": "",  # 後で更新
-            "r2Key": "",  # 後で更新
-            "uploadStatus": FileStatus.UPLOADING.value,
-            "chunkCount": chunk_count,
-            "uploadedChunks": 0,
-            "expiresAt": security.calculate_expiry(request.expires_in_hours),
-            "maxDownloads": request.max_downloads,
-            "userId": current_user.id  # 認証済みユーザーのIDを設定
-        })
-        
-        # アップロードセッションを作成
-        session = await prisma.uploadsession.create({
-            "sessionKey": session_key,
-            "fileId": file.id,
-            "status": "active",
-            "expiresAt": security.calculate_expiry(settings.UPLOAD_SESSION_EXPIRE_HOURS),
-            "metadata": json.dumps({
-                "chunk_size": request.chunk_size,
-                "total_chunks": chunk_count
-            })
-        })
+            "upload_mode": request.upload_mode.value
+        }
+        if request.upload_mode == UploadMode.MULTIPART:
+            # 全パートを最終ファイルのキーに直接アップロードする
+            final_key = security.generate_r2_key(file_id)
+            upload_id = await storage.create_multipart_upload(final_key)
+            if not upload_id:
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail="Failed to start multipart upload"
+                )
+            metadata["upload_id"] = upload_id
+            r2_keys = [final_key] * chunk_count
+        else:
+            r2_keys = [security.generate_r2_key(file_id, i) for i in range(chunk_count)]
+        
+        # セッションをRedisに登録できた場合はチャンクの進捗をRedisで管理する
+        # 登録できなかった場合はPostgreSQLで管理する
+        session = UploadSessionInfo(
+            id=str(uuid.uuid4()),
+            session_key=session_key,
+            file_id=file_id,
+            chunk_count=chunk_count,
+            expires_at=security.calculate_expiry(settings.UPLOAD_SESSION_EXPIRE_HOURS),
+            metadata={**metadata, "tracker": TRACKER_REDIS}
+        )
+        if not await upload_session_service.register(session):
+            session = dataclasses.replace(session, metadata={**metadata, "tracker": TRACKER_DATABASE})
+        metadata = session.metadata
         
-        # チャンク用の署名付きURLを生成
-        chunk_urls = []
-        for i in range(chunk_count):
-            r2_key = security.generate_r2_key(file.id, i)
-            presigned_url = await storage.generate_presigned_url(
-                key=r2_key,
-                operation='put_object',
-                expires_in=3600  # 1時間
-            )
-            chunk_urls.append(presigned_url)
-            
-            # チャンクレコードを作成
-            await prisma.filechunk.create({
-                "fileId": file.id,
-                "chunkIndex": i,
-                "size": min(request.chunk_size, request.size - i * request.chunk_size),
-                "r2Key": r2_key
-            })
+        # ファイル・セッション・全チャンクのレコードを1トランザクションで作成
+        # 途中で失敗した場合は全てロールバックされ、チャンクのないFileは残らない
+        # 共有IDをフィルターに追加できない場合も、他プロセスで存在しないと誤判定されるため作成を取り消す
+        try:
+            await _create_upload_records(request, current_user, file_id, share_id, session, r2_keys)
+            await id_filter.add("share", share_id)
+        except Exception:
+            await upload_session_service.discard(session_key)
+            if request.upload_mode == UploadMode.MULTIPART:
+                await storage.abort_multipart_upload(final_key, upload_id)
+            await prisma.uploadsession.delete_many(where={"sessionKey": session_key})
+            await prisma.file.delete_many(where={"id": file_id})
+            raise
+        
+        # 先頭ウィンドウ分の署名付きURLのみ生成（残りは get_chunk_upload_urls で随時取得）
+        chunk_urls = _presign_chunk_urls(
+            file_id,
+            metadata,
+            0,
+            min(settings.CHUNK_URL_WINDOW_SIZE, chunk_count)
+        )
         
         return InitiateUploadResponse(
-            file_id=file.id,
+            file_id=file_id,
             share_id=share_id,
             session_key=session_key,
             chunk_count=chunk_count,
-            chunk_urls=chunk_urls
+            chunk_urls=chunk_urls,
+            upload_mode=request.upload_mode
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to initiate upload: {e}")
         raise HTTPException(
@@ -118,131 +249,282 @@ async def initiate_upload(
         )
 
 
-@router.post("/upload/chunk", response_model=ChunkUploadResponse, operation_id="upload_chunk")
-async def upload_chunk(request: ChunkUploadRequest) -> ChunkUploadResponse:
+@router.get("/upload/{session_key}/chunk-urls", response_model=ChunkUrlsResponse, operation_id="get_chunk_upload_urls")
+async def get_chunk_upload_urls(
+    session_key: str,
+    start: int = Query(0, ge=0, description="先頭のチャンクインデックス"),
+    count: int = Query(
+        settings.CHUNK_URL_WINDOW_SIZE,
+        ge=1,
+        le=settings.CHUNK_URL_MAX_WINDOW_SIZE,
+        description="取得するURL数"
+    )
+) -> ChunkUrlsResponse:
     """
-    ファイルチャンクをアップロード
+    指定ウィンドウのチャンクアップロード用署名付きURLを取得
     
-    1. セッションの検証
-    2. チャンクデータをR2に保存
-    3. 進捗を更新
+    - 大きなファイルでも必要な分だけ都度発行するため、URLの期限切れを避けられる
+    - セッションキーで認証
     """
     try:
-        # セッションを取得
-        session = await prisma.uploadsession.find_unique(
-            where={"sessionKey": request.session_key}
-        )
-        if not session or session.status != "active":
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Invalid or expired session"
-            )
-        
-        # 有効期限チェック
-        if security.is_expired(session.expiresAt):
-            await prisma.uploadsession.update(
-                where={"id": session.id},
-                data={"status": "expired"}
-            )
-            raise HTTPException(
-                status_code=status.HTTP_410_GONE,
-                detail="Upload session expired"
-            )
-        
-        # ファイルとチャンク情報を取得
-        file = await prisma.file.find_unique(
-            where={"id": session.fileId},
-            include={"chunks": True}
-        )
-        if not file:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="File not found"
-            )
+        session = await _get_active_session(session_key)
         
-        # チャンクインデックスの検証
-        if request.chunk_index >= file.chunkCount:
+        if start >= session.chunk_count:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid chunk index"
             )
         
-        # 該当チャンクを取得
-        chunk = next(
-            (c for c in file.chunks if c.chunkIndex == request.chunk_index),
-            None
+        end = min(start + count, session.chunk_count)
+        chunk_urls = _presign_chunk_urls(session.file_id, session.metadata, start, end)
+        
+        return ChunkUrlsResponse(
+            start_index=start,
+            chunk_urls=chunk_urls,
+            total_chunks=session.chunk_count,
+            expires_in=settings.CHUNK_URL_EXPIRES_SECONDS
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to get chunk upload URLs: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get chunk upload URLs"
+        )
+
+
+def _session_unavailable() -> HTTPException:
+    """セッションの進捗管理先（Redis）に到達できない場合の例外"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Upload session store is temporarily unavailable",
+        headers={"Retry-After": "1"}
+    )
+
+
+async def _get_upload_target(session_key: str, chunk_index: int) -> tuple[UploadSessionInfo, ChunkTarget]:
+    """セッションと対象チャンクを取得して検証"""
+    # セッションを取得（ファイルID・チャンク数はキャッシュ済みのセッション情報から参照）
+    session = await _get_active_session(session_key)
+    
+    # チャンクインデックスの検証
+    if chunk_index < 0 or chunk_index >= session.chunk_count:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid chunk index"
+        )
+    
+    # 該当チャンクのみを取得（Redis管理のセッションはビットマップ、それ以外はユニークキーで検索）
+    try:
+        chunk = await upload_session_service.get_chunk(session, chunk_index)
+    except UploadSessionUnavailable:
+        raise _session_unavailable()
+    if not chunk:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chunk not found"
         )
-        if not chunk:
+    
+    return session, chunk
+
+
+async def _complete_chunk(
+    session: UploadSessionInfo,
+    chunk: ChunkTarget,
+    etag: Optional[str] = None
+) -> ChunkUploadResponse:
+    """
+    チャンクをアップロード済みにして進捗を更新
+
+    並行して同じファイルの複数チャンクがアップロードされても加算が失われないよう、
+    完了マークと進捗の加算はRedisのスクリプトまたはSQLの条件付き更新でアトミックに行う
+    """
+    try:
+        if chunk.uploaded:
+            # 既にアップロード済みの場合は現在の進捗を返す
+            uploaded_chunks = await upload_session_service.get_progress(session)
+        else:
+            result = await upload_session_service.mark_chunk_uploaded(session, chunk.index, etag)
+            uploaded_chunks = result[1] if result else None
+        if uploaded_chunks is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
-                detail="Chunk not found"
+                detail="Invalid or expired session"
             )
         
-        # 既にアップロード済みかチェック
-        if chunk.uploadedAt:
-            return ChunkUploadResponse(
-                chunk_index=request.chunk_index,
-                uploaded_chunks=file.uploadedChunks,
-                total_chunks=file.chunkCount,
-                is_complete=file.uploadedChunks == file.chunkCount
-            )
+        is_complete = uploaded_chunks == session.chunk_count
         
+        # 完了した場合はセッションを終了（Redis管理のセッションはここでPostgreSQLへ書き戻す）
+        # 書き戻しは冪等なため、失敗後の再送で再実行されても問題ない
+        if is_complete:
+            await upload_session_service.complete(session)
+    except UploadSessionUnavailable:
+        raise _session_unavailable()
+    
+    return ChunkUploadResponse(
+        chunk_index=chunk.index,
+        uploaded_chunks=uploaded_chunks,
+        total_chunks=session.chunk_count,
+        is_complete=is_complete
+    )
+
+
+async def _store_chunk(
+    session_key: str,
+    chunk_index: int,
+    read_chunk: Callable[[int], Awaitable[bytes | BinaryIO]]
+) -> ChunkUploadResponse:
+    """
+    チャンクを検証してR2に保存し、進捗を更新
+
+    read_chunkは期待されるチャンクサイズを受け取り、保存するデータを返す。
+    検証を通過し、未アップロードの場合にのみ呼び出される
+    """
+    session, chunk = await _get_upload_target(session_key, chunk_index)
+    if chunk.uploaded:
+        return await _complete_chunk(session, chunk)
+    
+    chunk_data = await read_chunk(chunk.size)
+    
+    # R2にアップロード（multipartモードではパートとして保存）
+    etag = None
+    if session.upload_mode == UploadMode.MULTIPART:
+        etag = await storage.upload_part(chunk.r2_key, session.upload_id, chunk_index + 1, chunk_data)
+        success = etag is not None
+    else:
+        success = await storage.upload_chunk(chunk.r2_key, chunk_data)
+    if not success:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to upload chunk to storage"
+        )
+    
+    return await _complete_chunk(session, chunk, etag)
+
+
+@router.post("/upload/chunk", response_model=ChunkUploadResponse, operation_id="upload_chunk")
+async def upload_chunk(request: ChunkUploadRequest) -> ChunkUploadResponse:
+    """
+    ファイルチャンクをアップロード（Base64 JSON形式、互換用）
+    
+    1. セッションの検証
+    2. チャンクデータをR2に保存
+    3. 進捗を更新
+    """
+    async def read_chunk(expected_size: int) -> bytes:
         # Base64デコード
         try:
-            chunk_data = base64.b64decode(request.chunk_data)
+            return base64.b64decode(request.chunk_data)
         except Exception:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid base64 encoded data"
             )
+    
+    try:
+        return await _store_chunk(request.session_key, request.chunk_index, read_chunk)
         
-        # R2にアップロード
-        success = await storage.upload_chunk(chunk.r2Key, chunk_data)
-        if not success:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to upload chunk to storage"
-            )
-        
-        # チャンクとファイルの状態を更新
-        await prisma.filechunk.update(
-            where={"id": chunk.id},
-            data={"uploadedAt": datetime.now(timezone.utc)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to upload chunk: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to upload chunk"
         )
-        
-        # アップロード済みチャンク数を更新
-        uploaded_chunks = file.uploadedChunks + 1
-        is_complete = uploaded_chunks == file.chunkCount
-        
-        await prisma.file.update(
-            where={"id": file.id},
-            data={
-                "uploadedChunks": uploaded_chunks,
-                "uploadStatus": FileStatus.COMPLETED.value if is_complete else FileStatus.UPLOADING.value
+
+
+@router.put(
+    "/upload/{session_key}/chunks/{chunk_index}",
+    response_model=ChunkUploadResponse,
+    operation_id="upload_chunk_binary",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/octet-stream": {
+                    "schema": {"type": "string", "format": "binary"}
+                }
             }
+        }
+    }
+)
+async def upload_chunk_binary(
+    session_key: str,
+    req: Request,
+    chunk_index: int = Path(..., ge=0)
+) -> ChunkUploadResponse:
+    """
+    ファイルチャンクをアップロード（application/octet-stream）
+    
+    - Base64エンコードを行わず、リクエストボディをそのまま受け取る
+    - ボディはメモリ上に全体を保持せず、一定サイズを超えると一時ファイルに退避してR2へ送る
+    """
+    try:
+        with tempfile.SpooledTemporaryFile(max_size=settings.CHUNK_SPOOL_MAX_MEMORY) as spool:
+            async def read_chunk(expected_size: int) -> BinaryIO:
+                received = 0
+                async for part in req.stream():
+                    received += len(part)
+                    if received > expected_size:
+                        raise HTTPException(
+                            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail="Chunk is larger than expected"
+                        )
+                    spool.write(part)
+                
+                if received != expected_size:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="Chunk size mismatch"
+                    )
+                
+                spool.seek(0)
+                return spool
+            
+            return await _store_chunk(session_key, chunk_index, read_chunk)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to upload chunk: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to upload chunk"
         )
+
+
+@router.post("/upload/{session_key}/parts/{chunk_index}", response_model=ChunkUploadResponse, operation_id="report_uploaded_part")
+async def report_uploaded_part(
+    session_key: str,
+    request: PartUploadedRequest,
+    chunk_index: int = Path(..., ge=0)
+) -> ChunkUploadResponse:
+    """
+    署名付きURLで直接アップロードしたパートを報告（multipartモード）
+    
+    - UploadPartのレスポンスに含まれるETagを記録し、進捗を更新
+    """
+    try:
+        session, chunk = await _get_upload_target(session_key, chunk_index)
         
-        # 完了した場合はセッションを終了
-        if is_complete:
-            await prisma.uploadsession.update(
-                where={"id": session.id},
-                data={"status": "completed"}
+        if session.upload_mode != UploadMode.MULTIPART:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Session is not in multipart mode"
             )
         
-        return ChunkUploadResponse(
-            chunk_index=request.chunk_index,
-            uploaded_chunks=uploaded_chunks,
-            total_chunks=file.chunkCount,
-            is_complete=is_complete
-        )
+        return await _complete_chunk(session, chunk, request.etag)
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Failed to upload chunk: {e}")
+        logger.error(f"Failed to record uploaded part: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to upload chunk"
+            detail="Failed to record uploaded part"
         )
 
 
@@ -289,7 +571,6 @@ async def complete_upload(
                 detail="Not all chunks have been uploaded"
             )
         
-        # チャンクを結合してR2に最終ファイルをアップロード
         r2_key = security.generate_r2_key(file.id)
         
         # 全チャンクを取得してソート
@@ -298,23 +579,39 @@ async def complete_upload(
             order={"chunkIndex": "asc"}
         )
         
-        # チャンクデータを結合
-        combined_data = bytearray()
-        for chunk in chunks:
-            chunk_data = await storage.download_chunk(chunk.r2Key)
-            if chunk_data is None:
+        metadata = upload_session_service.parse_metadata(session.metadata)
+        is_multipart = metadata.get("upload_mode") == UploadMode.MULTIPART
+        if is_multipart:
+            # パートは既に最終ファイルのキーにあるため、完了通知のみ行う
+            etags = {chunk.chunkIndex + 1: chunk.etag for chunk in chunks if chunk.etag}
+            if len(etags) < len(chunks):
+                # ETagが報告されていないパートはR2から取得
+                etags = {**await storage.list_part_etags(r2_key, metadata["upload_id"]), **etags}
+            if len(etags) < len(chunks):
                 raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"Failed to retrieve chunk {chunk.chunkIndex}"
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Not all parts have been uploaded"
                 )
-            combined_data.extend(chunk_data)
-        
-        # 結合されたファイルをR2にアップロード
-        success = await storage.upload_file(r2_key, bytes(combined_data))
+            success = await storage.complete_multipart_upload(
+                r2_key,
+                metadata["upload_id"],
+                [{"ETag": etags[part_number], "PartNumber": part_number} for part_number in sorted(etags)]
+            )
+        elif settings.COMPOSE_CHUNKS_ON_COMPLETE:
+            # チャンクをR2上で結合して最終ファイルを作成（データはAPIを経由しない）
+            success = await storage.compose_object(
+                r2_key,
+                [chunk.r2Key for chunk in chunks],
+                [chunk.size for chunk in chunks]
+            )
+        else:
+            # チャンクのまま保存し、ダウンロード時にchunkIndex順で連結して配信する
+            r2_key = ""
+            success = True
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to upload final file to storage"
+                detail="Failed to finalize file in storage"
             )
         
         # 暗号化キーを保存
@@ -327,15 +624,16 @@ async def complete_upload(
             }
         )
         
-        # チャンクファイルを削除（オプション）
-        for chunk in chunks:
-            await storage.delete_chunk(chunk.r2Key)
+        # 結合した場合はチャンクファイルを一括削除
+        if r2_key and not is_multipart:
+            await storage.delete_objects([chunk.r2Key for chunk in chunks])
         
         # セッションを完了
         await prisma.uploadsession.update(
             where={"id": session.id},
             data={"status": "completed"}
         )
+        await upload_session_service.discard(session.sessionKey)
         
         return {"message": "Upload completed successfully", "share_id": file.shareId}
         
@@ -349,65 +647,111 @@ async def complete_upload(
         )
 
 
+async def _fetch_recent_files(
+    user_id: str,
+    limit: int,
+    offset: int = 0,
+    cursor: Optional[str] = None
+) -> tuple[list[RecentFileItem], Optional[str]]:
+    """
+    ユーザーのファイルを新しい順に1ページ分取得し、(ファイル, 次ページのカーソル)を返す
+
+    リクエスト数・保留中のリクエスト数はファイルごとにSQL上で集計し、
+    リクエストの行を転送しない（コストはリクエスト数によらずページサイズに比例する）
+    """
+    # 次ページの有無を判定するため1件多く取得する（カーソル指定時はoffsetを使わない）
+    args: list = [user_id, limit + 1, 0 if cursor else offset]
+    cursor_condition = ""
+    if cursor:
+        created_at, file_id = decode_cursor(cursor)
+        cursor_condition = 'AND (f."createdAt", f."id") < ($4::timestamp(3), $5)'
+        args += [created_at, file_id]
+
+    rows = await prisma.query_raw(
+        f"""
+        SELECT f."id", f."shareId", f."filename", f."size", f."mimeType",
+               f."createdAt", f."expiresAt", f."maxDownloads", f."uniqueDownloadCount",
+               f."uploadStatus", f."blocksRequests", f."blocksDownloads",
+               r."requestCount", r."pendingRequestCount"
+        FROM "File" f
+        CROSS JOIN LATERAL (
+            SELECT COUNT(*)::int AS "requestCount",
+                   (COUNT(*) FILTER (WHERE "status" = 'pending'))::int AS "pendingRequestCount"
+            FROM "AccessRequest"
+            WHERE "fileId" = f."id"
+        ) r
+        WHERE f."userId" = $1 {cursor_condition}
+        ORDER BY f."createdAt" DESC, f."id" DESC
+        LIMIT $2 OFFSET $3
+        """,
+        *args
+    )
+
+    files = [
+        RecentFileItem(
+            file_id=row["id"],
+            share_id=row["shareId"],
+            filename=row["filename"],
+            size=row["size"],
+            mime_type=row["mimeType"],
+            created_at=row["createdAt"],
+            expires_at=row["expiresAt"],
+            max_downloads=row["maxDownloads"],
+            download_count=row["uniqueDownloadCount"],
+            request_count=row["requestCount"],
+            pending_request_count=row["pendingRequestCount"],
+            status=FileStatus(row["uploadStatus"]),
+            blocks_requests=row["blocksRequests"],
+            blocks_downloads=row["blocksDownloads"]
+        )
+        for row in rows
+    ]
+    if len(files) <= limit:
+        return files, None
+    files = files[:limit]
+    return files, encode_cursor(files[-1].created_at, files[-1].file_id)
+
+
 @router.get("/recent", response_model=RecentFilesResponse, operation_id="get_recent_files")
 async def get_recent_files(
-    limit: int = 10,
-    offset: int = 0,
+    limit: int = Query(10, ge=1, le=settings.MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0, description="取得開始位置（cursor指定時は無視）"),
+    cursor: Optional[str] = Query(None, description="前のページの next_cursor"),
+    include_total: bool = Query(True, description="総数（概算）を含めるか"),
     current_user: AuthUser = Depends(require_auth)
 ) -> RecentFilesResponse:
-    """認証されたユーザーの最近アップロードされたファイル一覧を取得（最新順）"""
+    """
+    認証されたユーザーの最近アップロードされたファイル一覧を取得（最新順）
+    
+    - 続きのページは next_cursor を cursor に指定して取得する（件数によらず一定のコスト）
+    - offset はページ番号で移動する場合のみ使う
+    """
     try:
         logger.info(f"Fetching recent {limit} files for user {current_user.id} with offset {offset}")
         
-        # 総数を取得
-        total_count = await prisma.file.count(
-            where={"userId": current_user.id}
-        )
+        # 総数（概算）を取得
+        total_count = None
+        if include_total:
+            total_count = await cached_total(
+                ("files", current_user.id),
+                lambda: prisma.file.count(where={"userId": current_user.id})
+            )
         
-        files = await prisma.file.find_many(
-            where={"userId": current_user.id},  # ユーザーのファイルのみ
-            take=limit,
-            skip=offset,
-            order={"createdAt": "desc"},  # 最新順
-            include={
-                "downloads": True,
-                "requests": True  # 全てのリクエスト（pending, approved, rejected）をカウント
-            }
-        )
+        # 全てのリクエスト（pending, approved, rejected）と保留中のリクエストの数を含めて取得
+        files, next_cursor = await _fetch_recent_files(current_user.id, limit, offset, cursor)
         
         logger.info(f"Found {len(files)} files")
         
-        result = []
-        for file in files:
-            # 全リクエスト数とpendingリクエスト数を計算
-            all_requests = len(file.requests)
-            pending_requests = len([req for req in file.requests if req.status == "pending"])
-            
-            item = RecentFileItem(
-                file_id=file.id,
-                share_id=file.shareId,
-                filename=file.filename,
-                size=file.size,
-                mime_type=file.mimeType,
-                created_at=file.createdAt,
-                expires_at=file.expiresAt,
-                max_downloads=file.maxDownloads,
-                download_count=len(set(download.requestId for download in file.downloads)),
-                request_count=all_requests,
-                pending_request_count=pending_requests,
-                status=FileStatus(file.uploadStatus),
-                blocks_requests=file.blocksRequests,
-                blocks_downloads=file.blocksDownloads
-            )
-            result.append(item)
-        
         return RecentFilesResponse(
-            files=result,
+            files=files,
             total=total_count,
             limit=limit,
-            offset=offset
+            offset=offset,
+            next_cursor=next_cursor
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to get recent files: {e}")
         raise HTTPException(
@@ -421,10 +765,7 @@ async def get_file_info(file_id: str) -> FileInfoResponse:
     """ファイル情報を取得"""
     try:
         file = await prisma.file.find_unique(
-            where={"id": file_id},
-            include={
-                "downloads": True
-            }
+            where={"id": file_id}
         )
         
         if not file:
@@ -443,7 +784,7 @@ async def get_file_info(file_id: str) -> FileInfoResponse:
             created_at=file.createdAt,
             expires_at=file.expiresAt,
             max_downloads=file.maxDownloads,
-            download_count=len(set(download.requestId for download in file.downloads)),
+            download_count=file.uniqueDownloadCount,
             blocks_requests=file.blocksRequests,
             blocks_downloads=file.blocksDownloads
         )
@@ -468,10 +809,7 @@ async def update_file(
     try:
         # ファイルを取得
         file = await prisma.file.find_unique(
-            where={"id": file_id},
-            include={
-                "downloads": True
-            }
+            where={"id": file_id}
         )
         
         if not file:
@@ -503,11 +841,9 @@ async def update_file(
             
         updated_file = await prisma.file.update(
             where={"id": file_id},
-            data=update_data,
-            include={
-                "downloads": True
-            }
+            data=update_data
         )
+        await share_cache.invalidate(updated_file.shareId)
         
         return FileInfoResponse(
             file_id=updated_file.id,
@@ -519,7 +855,7 @@ async def update_file(
             created_at=updated_file.createdAt,
             expires_at=updated_file.expiresAt,
             max_downloads=updated_file.maxDownloads,
-            download_count=len(set(download.requestId for download in updated_file.downloads)),
+            download_count=updated_file.uniqueDownloadCount,
             blocks_requests=updated_file.blocksRequests,
             blocks_downloads=updated_file.blocksDownloads
         )
@@ -1,12 +1,17 @@
 # backend/app/api/v1/endpoints/requests.py
-from fastapi import APIRouter, HTTPException, Request, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
 from fastapi import status
+from fastapi.responses import StreamingResponse
 from app.schemas.request import (
     CreateAccessRequestRequest,
     CreateAccessRequestResponse,
     ApproveRequestRequest,
     ApproveRequestResponse,
     RejectRequestRequest,
+    BulkRequestAction,
+    BulkRequestActionRequest,
+    BulkRequestActionResponse,
+    BulkRequestResult,
     RequestInfo,
     AccessRequestItem,
     RequestListResponse,
@@ -14,8 +19,17 @@ from app.schemas.request import (
     RequestStatus
 )
 from app.schemas.file import FileStatus
+from app.schemas.auth import AuthUser
 from app.core.database import prisma
 from app.core.security import security
+from app.core.auth import require_auth
+from app.core.config import settings
+from app.core.pagination import fetch_page
+from app.core.rate_limit import rate_limit
+from app.core.pubsub import SSE_HEADERS, event_hub, request_channel, sse_stream, user_channel
+from app.services.id_filter import id_filter
+from app.services.share_cache import share_cache
+from redis.exceptions import RedisError
 from typing import Optional
 import logging
 
@@ -23,7 +37,25 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-@router.post("/", response_model=CreateAccessRequestResponse, operation_id="create_access_request")
+def _status_event(access_request) -> dict:
+    """ステータス変更イベント（SSEで受信者に送る）"""
+    return {
+        "event": "status",
+        "data": {
+            "request_id": access_request.requestId,
+            "status": access_request.status,
+            "approved_at": access_request.approvedAt,
+            "rejected_at": access_request.rejectedAt
+        }
+    }
+
+
+def _is_final_status(event: dict) -> bool:
+    """承認・拒否されたら受信者への通知を終了する"""
+    return event["data"]["status"] != RequestStatus.PENDING.value
+
+
+@router.post("/", response_model=CreateAccessRequestResponse, operation_id="create_access_request", dependencies=[Depends(rate_limit("create_access_request"))])
 async def create_access_request(
     request: CreateAccessRequestRequest,
     req: Request
@@ -36,10 +68,8 @@ async def create_access_request(
     - IPアドレスはハッシュ化して保存
     """
     try:
-        # ファイルを取得
-        file = await prisma.file.find_unique(
-            where={"shareId": request.share_id}
-        )
+        # ファイルを取得（キャッシュ経由）
+        file = await share_cache.get(request.share_id)
         
         if not file:
             raise HTTPException(
@@ -48,32 +78,28 @@ async def create_access_request(
             )
         
         # ファイルの状態チェック
-        if file.uploadStatus != FileStatus.COMPLETED.value:
+        if file.upload_status != FileStatus.COMPLETED.value:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="File is not available yet"
             )
         
         # リクエスト受付停止チェック
-        if file.blocksRequests:
+        if file.blocks_requests:
             raise HTTPException(
                 status_code=status.HTTP_410_GONE,
                 detail="This file is not accepting new requests"
             )
         
         # 有効期限チェック
-        if security.is_expired(file.expiresAt):
+        if security.is_expired(file.expires_at):
             raise HTTPException(
                 status_code=status.HTTP_410_GONE,
                 detail="This share has expired"
             )
         
-        # ダウンロード数チェック（ユニークなリクエストID数で制限）
-        download_logs = await prisma.downloadlog.find_many(
-            where={"fileId": file.id}
-        )
-        unique_request_count = len(set(log.requestId for log in download_logs))
-        if unique_request_count >= file.maxDownloads:
+        # ダウンロード数チェック（ダウンロードしたユニークなリクエスト数で制限）
+        if file.unique_download_count >= file.max_downloads:
             raise HTTPException(
                 status_code=status.HTTP_410_GONE,
                 detail="Download limit exceeded"
@@ -86,7 +112,7 @@ async def create_access_request(
         # 同じIPから同じファイルへの重複リクエストチェック
         existing_request = await prisma.accessrequest.find_first(
             where={
-                "fileId": file.id,
+                "fileId": file.file_id,
                 "ipHash": ip_hash,
                 "status": RequestStatus.PENDING.value
             }
@@ -105,11 +131,27 @@ async def create_access_request(
         # アクセスリクエストを作成
         access_request = await prisma.accessrequest.create({
             "requestId": request_id,
-            "fileId": file.id,
+            "fileId": file.file_id,
             "reason": request.reason,
             "status": RequestStatus.PENDING.value,
             "ipHash": ip_hash
         })
+        # フィルターに追加できない場合は、他プロセスで存在しないと誤判定されるため作成を取り消す
+        try:
+            await id_filter.add("request", access_request.requestId)
+        except RedisError:
+            await prisma.accessrequest.delete(where={"id": access_request.id})
+            raise
+        
+        # ファイル所有者に通知
+        if file.user_id:
+            await event_hub.publish(user_channel(file.user_id), "request_created", {
+                "request_id": access_request.requestId,
+                "file_id": file.file_id,
+                "filename": file.filename,
+                "reason": access_request.reason,
+                "created_at": access_request.createdAt
+            })
         
         return CreateAccessRequestResponse(
             request_id=access_request.requestId,
@@ -129,12 +171,15 @@ async def create_access_request(
 
 @router.get("/file/{file_id}", response_model=FileRequestListResponse, operation_id="get_file_requests")
 async def get_file_requests(
-    file_id: str
+    file_id: str,
+    limit: int = Query(settings.MAX_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="前のページの next_cursor")
 ) -> FileRequestListResponse:
     """
-    ファイルに対するアクセスリクエスト一覧を取得
+    ファイルに対するアクセスリクエスト一覧を取得（新しい順）
     
     - 送信者がリクエストを確認するため
+    - 続きのページは next_cursor を cursor に指定して取得する
     """
     try:
         # ファイルの存在確認
@@ -148,9 +193,11 @@ async def get_file_requests(
             )
         
         # リクエスト一覧を取得
-        requests = await prisma.accessrequest.find_many(
-            where={"fileId": file_id},
-            order={"createdAt": "desc"}
+        requests, next_cursor = await fetch_page(
+            prisma.accessrequest,
+            {"fileId": file_id},
+            limit,
+            cursor=cursor
         )
         
         # レスポンス形式に変換
@@ -164,7 +211,8 @@ async def get_file_requests(
             ))
         
         return FileRequestListResponse(
-            requests=access_request_items
+            requests=access_request_items,
+            next_cursor=next_cursor
         )
         
     except HTTPException:
@@ -228,6 +276,10 @@ async def approve_request(
         # TODO: 暗号化された鍵を安全に保存する仕組みを実装
         # 現在は簡易的にファイルの encryptedKey フィールドを使用
         
+        # ステータスを待っている受信者に通知
+        event = _status_event(updated_request)
+        await event_hub.publish(request_channel(request_id), event["event"], event["data"])
+        
         return ApproveRequestResponse(
             request_id=updated_request.requestId,
             status=RequestStatus(updated_request.status),
@@ -276,7 +328,7 @@ async def reject_request(
         
         # リクエストを拒否
         from datetime import datetime
-        await prisma.accessrequest.update(
+        updated_request = await prisma.accessrequest.update(
             where={"id": access_request.id},
             data={
                 "status": RequestStatus.REJECTED.value,
@@ -284,6 +336,10 @@ async def reject_request(
             }
         )
         
+        # ステータスを待っている受信者に通知
+        event = _status_event(updated_request)
+        await event_hub.publish(request_channel(request_id), event["event"], event["data"])
+        
         return {"message": "Request rejected successfully"}
         
     except HTTPException:
@@ -296,7 +352,107 @@ async def reject_request(
         )
 
 
-@router.get("/{request_id}/status", operation_id="get_request_status")
+@router.post("/bulk", response_model=BulkRequestActionResponse, operation_id="bulk_update_requests")
+async def bulk_update_requests(
+    body: BulkRequestActionRequest,
+    current_user: AuthUser = Depends(require_auth)
+) -> BulkRequestActionResponse:
+    """
+    アクセスリクエストを一括で承認・拒否
+    
+    - 自分のファイルに対するリクエストのみ対象
+    - 承認は保留中のリクエストのみ（ファイルの有効期限・ダウンロード上限を確認）
+    - 拒否は拒否済み以外のリクエスト
+    - リクエストごとの結果を返す（一部が失敗しても他のリクエストは更新する）
+    """
+    try:
+        request_ids = list(dict.fromkeys(body.request_ids))
+        approve = body.action == BulkRequestAction.APPROVE
+        target_status = RequestStatus.APPROVED.value if approve else RequestStatus.REJECTED.value
+        
+        # 対象のリクエストとファイルを一括取得
+        access_requests = await prisma.accessrequest.find_many(
+            where={"requestId": {"in": request_ids}},
+            include={"file": True}
+        )
+        by_id = {r.requestId: r for r in access_requests}
+        
+        errors: dict[str, str] = {}
+        for request_id in request_ids:
+            access_request = by_id.get(request_id)
+            # 他のユーザーのリクエストは存在しないものとして扱う
+            if not access_request or access_request.file.userId != current_user.id:
+                errors[request_id] = "Request not found"
+            elif approve and access_request.status != RequestStatus.PENDING.value:
+                errors[request_id] = f"Request is already {access_request.status}"
+            elif not approve and access_request.status == RequestStatus.REJECTED.value:
+                errors[request_id] = "Request is already rejected"
+            elif approve and security.is_expired(access_request.file.expiresAt):
+                errors[request_id] = "File has expired"
+            elif approve and access_request.file.uniqueDownloadCount >= access_request.file.maxDownloads:
+                errors[request_id] = "Download limit exceeded"
+        
+        valid_ids = [request_id for request_id in request_ids if request_id not in errors]
+        
+        if valid_ids:
+            from datetime import datetime, timezone
+            # DBはミリ秒精度のため、読み戻した値と比較できるよう切り捨てる
+            now = datetime.now(timezone.utc)
+            now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+            timestamp_field = "approvedAt" if approve else "rejectedAt"
+            if approve:
+                where = {"requestId": {"in": valid_ids}, "status": RequestStatus.PENDING.value}
+                data = {"status": target_status, "approvedAt": now}
+            else:
+                where = {"requestId": {"in": valid_ids}, "status": {"not": RequestStatus.REJECTED.value}}
+                data = {"status": target_status, "rejectedAt": now}
+            
+            async with prisma.tx() as transaction:
+                # 確認後に他の操作でステータスが変わったリクエストは条件に一致せず更新されない
+                updated = await transaction.accessrequest.update_many(where=where, data=data)
+                if updated != len(valid_ids):
+                    # 今回の更新で変更したリクエストのみ成功とする
+                    # （確認後に他の操作で同じステータスになったリクエストは日時が一致しない）
+                    current = await transaction.accessrequest.find_many(
+                        where={"requestId": {"in": valid_ids}}
+                    )
+                    for r in current:
+                        if r.status != target_status or getattr(r, timestamp_field) != now:
+                            errors[r.requestId] = f"Request is already {r.status}"
+                    found = {r.requestId for r in current}
+                    for request_id in valid_ids:
+                        if request_id not in found:
+                            errors[request_id] = "Request not found"
+            
+            # ステータスを待っている受信者に通知
+            await event_hub.publish_many([
+                (request_channel(request_id), "status", _status_event(by_id[request_id].model_copy(update=data))["data"])
+                for request_id in valid_ids if request_id not in errors
+            ])
+        
+        results = [
+            BulkRequestResult(request_id=request_id, success=False, error=errors[request_id])
+            if request_id in errors
+            else BulkRequestResult(request_id=request_id, success=True, status=RequestStatus(target_status))
+            for request_id in request_ids
+        ]
+        
+        return BulkRequestActionResponse(
+            results=results,
+            updated=sum(1 for result in results if result.success)
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to bulk update requests: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to bulk update requests"
+        )
+
+
+@router.get("/{request_id}/status", operation_id="get_request_status", dependencies=[Depends(rate_limit("get_request_status"))])
 async def get_request_status(request_id: str):
     """
     リクエストのステータスを確認
@@ -306,8 +462,11 @@ async def get_request_status(request_id: str):
     """
     try:
         # リクエストを取得
-        access_request = await prisma.accessrequest.find_unique(
-            where={"requestId": request_id}
+        # 存在しないIDはBloomフィルター・ネガティブキャッシュでDB検索前に除外
+        access_request = await id_filter.lookup(
+            "request",
+            request_id,
+            lambda: prisma.accessrequest.find_unique(where={"requestId": request_id})
         )
         
         if not access_request:
@@ -358,4 +517,46 @@ async def get_request_status(request_id: str):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get request status"
-        )
\ No newline at end of file
+        )
+
+
+@router.get("/{request_id}/events", operation_id="get_request_events", dependencies=[Depends(rate_limit("get_request_events"))])
+async def get_request_events(request_id: str):
+    """
+    リクエストのステータス変更をServer-Sent Eventsで通知
+    
+    - 受信者がステータスのポーリングの代わりに使う
+    - 接続時に現在のステータスを送り、承認・拒否された時点で通知して終了する
+    - 一定時間で接続を終了するため、クライアントは再接続する
+    """
+    # 先に購読してからステータスを読み込み、その間の承認・拒否を取りこぼさないようにする
+    subscription = await event_hub.subscribe(request_channel(request_id))
+    try:
+        access_request = await id_filter.lookup(
+            "request",
+            request_id,
+            lambda: prisma.accessrequest.find_unique(where={"requestId": request_id})
+        )
+        
+        if not access_request:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Request not found"
+            )
+        
+        return StreamingResponse(
+            sse_stream(subscription, [_status_event(access_request)], _is_final_status),
+            media_type="text/event-stream",
+            headers=SSE_HEADERS
+        )
+        
+    except HTTPException:
+        subscription.close()
+        raise
+    except Exception as e:
+        subscription.close()
+        logger.error(f"Failed to get request events: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get request events"
+        )
@@ -1,15 +1,16 @@
 # backend/app/api/v1/endpoints/shares.py
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from app.schemas.file import FileInfoResponse, FileStatus
-from app.core.database import prisma
+from app.services.share_cache import share_cache
 from app.core.security import security
+from app.core.rate_limit import rate_limit
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-@router.get("/{share_id}", response_model=FileInfoResponse, operation_id="get_share_info")
+@router.get("/{share_id}", response_model=FileInfoResponse, operation_id="get_share_info", dependencies=[Depends(rate_limit("get_share_info"))])
 async def get_share_info(share_id: str) -> FileInfoResponse:
     """
     共有IDからファイル情報を取得
@@ -25,13 +26,8 @@ async def get_share_info(share_id: str) -> FileInfoResponse:
                 detail="Invalid share ID format"
             )
         
-        # ファイルを取得
-        file = await prisma.file.find_unique(
-            where={"shareId": share_id},
-            include={
-                "downloads": True
-            }
-        )
+        # ファイルを取得（キャッシュ経由）
+        file = await share_cache.get(share_id)
         
         if not file:
             raise HTTPException(
@@ -40,30 +36,30 @@ async def get_share_info(share_id: str) -> FileInfoResponse:
             )
         
         # アップロード完了チェック
-        if file.uploadStatus != FileStatus.COMPLETED.value:
+        if file.upload_status != FileStatus.COMPLETED.value:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="File upload is not completed"
             )
         
         # 有効期限チェック
-        if security.is_expired(file.expiresAt):
+        if security.is_expired(file.expires_at):
             raise HTTPException(
                 status_code=status.HTTP_410_GONE,
                 detail="This share has expired"
             )
         
         return FileInfoResponse(
-            file_id=file.id,
-            share_id=file.shareId,
+            file_id=file.file_id,
+            share_id=file.share_id,
             filename=file.filename,
             size=file.size,
-            mime_type=file.mimeType,
-            status=FileStatus(file.uploadStatus),
-            created_at=file.createdAt,
-            expires_at=file.expiresAt,
-            max_downloads=file.maxDownloads,
-            download_count=len(set(download.requestId for download in file.downloads))
+            mime_type=file.mime_type,
+            status=FileStatus(file.upload_status),
+            created_at=file.created_at,
+            expires_at=file.expires_at,
+            max_downloads=file.max_downloads,
+            download_count=file.unique_download_count
         )
         
     except HTTPException:
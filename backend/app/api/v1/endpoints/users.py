@@ -1,9 +1,13 @@
 # backend/app/api/v1/endpoints/users.py
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi.responses import StreamingResponse
 from typing import Annotated, Optional
 from app.schemas.auth import UserResponse, UserUpdate, AuthUser
 from app.core.database import prisma
-from app.core.auth import get_current_user, require_auth
+from app.core.auth import auth_service, get_current_user, require_auth
+from app.core.config import settings
+from app.core.pagination import cached_total, fetch_page
+from app.core.pubsub import SSE_HEADERS, event_hub, sse_stream, user_channel
 import logging
 
 logger = logging.getLogger(__name__)
@@ -66,6 +70,7 @@ async def update_user_profile(
                 where={"id": current_user.id},
                 data=update_fields
             )
+            auth_service.invalidate_user(current_user.id)
         
         if not user:
             raise HTTPException(
@@ -95,36 +100,51 @@ async def update_user_profile(
 @router.get("/me/files", operation_id="get_user_files")
 async def get_user_files(
     current_user: Annotated[AuthUser, Depends(require_auth)],
-    page: int = 1,
-    per_page: int = 20
+    page: int = Query(1, ge=1, description="ページ番号（cursor指定時は無視）"),
+    per_page: int = Query(20, ge=1, le=settings.MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="前のページの next_cursor"),
+    include_total: bool = Query(True, description="総数（概算）を含めるか")
 ):
-    """ユーザーがアップロードしたファイル一覧を取得"""
+    """
+    ユーザーがアップロードしたファイル一覧を取得
+    
+    - 続きのページは next_cursor を cursor に指定して取得する
+    """
     try:
-        skip = (page - 1) * per_page
+        where = {"userId": current_user.id}
         
         # ユーザーのファイル一覧を取得
-        files = await prisma.file.find_many(
-            where={"userId": current_user.id},
-            skip=skip,
-            take=per_page,
-            order={"createdAt": "desc"},
+        files, next_cursor = await fetch_page(
+            prisma.file,
+            where,
+            per_page,
+            cursor=cursor,
+            skip=0 if cursor else (page - 1) * per_page,
             include={
                 "downloads": True,
                 "requests": {"where": {"status": "pending"}}
             }
         )
         
-        # 総数を取得
-        total = await prisma.file.count(where={"userId": current_user.id})
+        # 総数（概算）を取得
+        total = None
+        if include_total:
+            total = await cached_total(
+                ("files", current_user.id),
+                lambda: prisma.file.count(where=where)
+            )
         
         return {
             "files": files,
             "total": total,
             "page": page,
             "per_page": per_page,
-            "pages": (total + per_page - 1) // per_page
+            "pages": (total + per_page - 1) // per_page if total is not None else None,
+            "next_cursor": next_cursor
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to get user files: {e}")
         raise HTTPException(
@@ -133,6 +153,35 @@ async def get_user_files(
         )
 
 
+@router.get("/me/events", operation_id="get_user_events")
+async def get_user_events(
+    current_user: Annotated[AuthUser, Depends(require_auth)]
+):
+    """
+    ファイル所有者向けのイベントをServer-Sent Eventsで通知
+    
+    - request_created: アクセスリクエストが作成された
+    - download_started: ファイルのダウンロードが開始された
+    - file_expired: ファイルが期限切れになった
+    - 接続時に ready を送る（クライアントは受信後に一覧を再取得し、接続前の変更を反映する）
+    - 一定時間で接続を終了するため、クライアントは再接続する
+    """
+    try:
+        subscription = await event_hub.subscribe(user_channel(current_user.id))
+        return StreamingResponse(
+            sse_stream(subscription, [{"event": "ready", "data": {}}]),
+            media_type="text/event-stream",
+            headers=SSE_HEADERS
+        )
+        
+    except Exception as e:
+        logger.error(f"Failed to get user events: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get user events"
+        )
+
+
 @router.delete("/me", operation_id="delete_user_account")
 async def delete_user_account(
     current_user: Annotated[AuthUser, Depends(require_auth)]
@@ -141,6 +190,7 @@ async def delete_user_account(
     try:
         # ユーザーに関連するファイルを削除（カスケード削除）
         await prisma.user.delete(where={"id": current_user.id})
+        auth_service.invalidate_user(current_user.id)
         
         return {"message": "User account deleted successfully"}
         
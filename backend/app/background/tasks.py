@@ -7,42 +7,34 @@ import asyncio
 from datetime import datetime, timezone
 import logging
 
-import aioboto3
-from botocore.exceptions import ClientError
 import dramatiq
+import redis
 from dramatiq.brokers.redis import RedisBroker
 from dramatiq.results import Results
 from dramatiq.results.backends.redis import RedisBackend
 
 from app.core.database import prisma
+from app.core.security import security
 from app.core.storage import R2Storage
 from app.core.config import settings
+from app.core.pubsub import encode_event, user_channel
+from app.services.id_filter import SWAP_SCRIPT, filter_keys, new_filter
+from app.services.share_cache import ShareCacheService
+from app.services.upload_session import UploadSessionService
 
 logger = logging.getLogger(__name__)
 
 
-async def delete_chunk_from_r2(key: str) -> bool:
+async def delete_objects_from_r2(r2: R2Storage, keys: list[str]) -> bool:
     """
-    R2からチャンクを削除するヘルパー関数
-    新しいセッションを使用してEvent loop closedエラーを回避
+    R2からオブジェクトを一括削除するヘルパー関数
+    タスク実行ごとに開いたクライアントプールを使い回す
     """
-    session = aioboto3.Session()
-    async with session.client(
-        's3',
-        endpoint_url=settings.R2_ENDPOINT,
-        aws_access_key_id=settings.R2_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.R2_SECRET_ACCESS_KEY,
-        region_name='auto'
-    ) as client:
-        try:
-            await client.delete_object(
-                Bucket=settings.R2_BUCKET_NAME,
-                Key=key
-            )
-            return True
-        except ClientError as e:
-            logger.error(f"Failed to delete object {key}: {e}")
-            return False
+    return await r2.delete_objects(keys)
+
+
+# キャッシュ無効化などに使う同期Redisクライアント（asyncio.runごとのイベントループに依存しない）
+redis_client = redis.Redis.from_url(settings.REDIS_URL)
 
 
 # Redis結果バックエンド設定
@@ -67,6 +59,18 @@ def cleanup_expired_files_storage():
         raise  # Dramatiqが自動的にリトライを処理
 
 
+@dramatiq.actor(max_retries=3, min_backoff=60000)  # 1分後にリトライ、最大3回
+def rebuild_id_filters():
+    """共有ID・リクエストIDのBloomフィルター再構築タスク"""
+    try:
+        result = asyncio.run(_rebuild_id_filters_async())
+        logger.info(f"ID filter rebuild completed: {result}")
+        return result
+    except Exception as e:
+        logger.error(f"ID filter rebuild failed: {e}")
+        raise
+
+
 @dramatiq.actor(max_retries=3, min_backoff=300000)  # 5分後にリトライ、最大3回
 def cleanup_expired_upload_sessions():
     """期限切れアップロードセッションのクリーンアップタスク"""
@@ -89,6 +93,10 @@ async def _cleanup_expired_files_storage_async() -> dict:
     except Exception as e:
         logger.warning(f"Prisma already connected or connection failed: {e}")
     
+    # R2クライアントはイベントループに紐づくため、asyncio.runごとに開いて閉じる
+    r2 = R2Storage()
+    await r2.connect()
+
     try:
         # 期限切れファイルを検索（DBレコードは残す、ストレージのみ削除）
         expired_files = await prisma.file.find_many(
@@ -112,19 +120,19 @@ async def _cleanup_expired_files_storage_async() -> dict:
         
         processed_count = 0
         errors = []
+        blocked_share_ids = []
+        expired_events = []
         
         for file in expired_files:
             try:
-                # R2からファイルチャンクを削除
-                if file.chunks:
-                    for chunk in file.chunks:
-                        try:
-                            # 各削除操作で新しいセッションを使用してEvent loop closedエラーを回避
-                            await delete_chunk_from_r2(chunk.r2Key)
-                            logger.debug(f"Deleted storage chunk: {chunk.r2Key}")
-                        except Exception as e:
-                            logger.warning(f"Failed to delete chunk {chunk.r2Key}: {e}")
-                            errors.append(f"Storage deletion failed for chunk {chunk.id}: {e}")
+                # R2から結合済みファイルと残っているチャンクを一括削除
+                # multipartモードではチャンクのキーが最終ファイルと同じため重複を除く
+                keys = list(dict.fromkeys(
+                    [chunk.r2Key for chunk in file.chunks or []] + ([file.r2Key] if file.r2Key else [])
+                ))
+                if keys and not await delete_objects_from_r2(r2, keys):
+                    logger.warning(f"Failed to delete some storage objects of file {file.id}")
+                    errors.append(f"Storage deletion failed for file {file.id}")
                 
                 # ファイルを無効化としてマーク（DBレコードは保持）
                 # 期限切れファイルは両方のフラグを立てて完全アクセス不可にする
@@ -136,6 +144,13 @@ async def _cleanup_expired_files_storage_async() -> dict:
                     }
                 )
                 
+                blocked_share_ids.append(file.shareId)
+                if file.userId:
+                    expired_events.append((user_channel(file.userId), encode_event("file_expired", {
+                        "file_id": file.id,
+                        "filename": file.filename,
+                        "expires_at": file.expiresAt
+                    })))
                 processed_count += 1
                 logger.info(f"Cleaned up storage for expired file: {file.filename} (ID: {file.id})")
                 
@@ -143,6 +158,26 @@ async def _cleanup_expired_files_storage_async() -> dict:
                 logger.error(f"Failed to cleanup file {file.id}: {e}")
                 errors.append(f"File {file.id}: {e}")
         
+        # フラグを変更したファイルの共有情報キャッシュを削除
+        if blocked_share_ids:
+            try:
+                pipe = redis_client.pipeline(transaction=False)
+                for share_id in blocked_share_ids:
+                    ShareCacheService.queue_invalidation(pipe, share_id)
+                pipe.execute()
+            except redis.RedisError as e:
+                logger.warning(f"Failed to invalidate share cache: {e}")
+        
+        # ファイル所有者に期限切れを通知
+        if expired_events:
+            try:
+                pipe = redis_client.pipeline(transaction=False)
+                for channel, message in expired_events:
+                    pipe.publish(channel, message)
+                pipe.execute()
+            except redis.RedisError as e:
+                logger.warning(f"Failed to publish file expired events: {e}")
+        
         return {
             "processed_files": processed_count,
             "total_expired": len(expired_files),
@@ -156,6 +191,8 @@ async def _cleanup_expired_files_storage_async() -> dict:
             "total_expired": 0,
             "errors": [str(e)]
         }
+    finally:
+        await r2.disconnect()
 
 
 async def _cleanup_expired_upload_sessions_async() -> dict:
@@ -167,6 +204,9 @@ async def _cleanup_expired_upload_sessions_async() -> dict:
         await prisma.connect()
     except Exception as e:
         logger.warning(f"Prisma already connected or connection failed: {e}")
+    
+    r2 = R2Storage()
+    await r2.connect()
         
     try:
         
@@ -174,10 +214,29 @@ async def _cleanup_expired_upload_sessions_async() -> dict:
         expired_sessions = await prisma.uploadsession.find_many(
             where={
                 "expiresAt": {"lt": current_time},
-                "status": {"in": ["active"]}  # アクティブなセッション
+                "status": {"in": ["active", "expired"]}  # 完了していないセッション
             }
         )
         
+        # multipartモードのセッションは最後のパートの完了時に completed になるため、
+        # complete_upload（CompleteMultipartUpload）が実行されないまま期限切れになったものも対象にする
+        # （結合済みオブジェクトが無いためパートは期限切れファイルのクリーンアップでも削除されない）
+        unfinished_multipart = await prisma.query_raw(
+            """
+            SELECT s."id"
+            FROM "UploadSession" s
+            JOIN "File" f ON f."id" = s."fileId"
+            WHERE s."status" = 'completed'
+              AND s."expiresAt" < NOW() AT TIME ZONE 'UTC'
+              AND f."r2Key" = ''
+              AND s."metadata"::text LIKE '%upload_id%'
+            """
+        )
+        if unfinished_multipart:
+            expired_sessions += await prisma.uploadsession.find_many(
+                where={"id": {"in": [row["id"] for row in unfinished_multipart]}}
+            )
+        
         if not expired_sessions:
             logger.info("No expired upload sessions found")
             return {"deleted_sessions": 0, "errors": []}
@@ -190,9 +249,18 @@ async def _cleanup_expired_upload_sessions_async() -> dict:
         for session in expired_sessions:
             try:
                 # UploadSessionにはchunksがないため、メタデータをチェックしてクリーンアップ
-                # 必要に応じてsession.metadataからファイル情報を取得してストレージから削除
+                # multipartモードの放棄されたアップロードは中止してパートを破棄する
+                metadata = UploadSessionService.parse_metadata(session.metadata)
+                if metadata.get("upload_id") and session.fileId:
+                    aborted = await r2.abort_multipart_upload(
+                        security.generate_r2_key(session.fileId),
+                        metadata["upload_id"]
+                    )
+                    if not aborted:
+                        errors.append(f"Failed to abort multipart upload of session {session.id}")
                 
                 # セッションを削除（未完了セッションなのでDBからも削除）
+                # multipartのアップロードを中止したセッションは complete_upload で完了できないため合わせて削除する
                 await prisma.uploadsession.delete(where={"id": session.id})
                 
                 deleted_count += 1
@@ -215,3 +283,33 @@ async def _cleanup_expired_upload_sessions_async() -> dict:
             "total_expired": 0,
             "errors": [str(e)]
         }
+    finally:
+        await r2.disconnect()
+
+
+async def _rebuild_id_filters_async() -> dict:
+    """DB上の全IDからBloomフィルターを再構築してRedisのフィルターを差し替える（非同期実装）"""
+    try:
+        await prisma.connect()
+    except Exception as e:
+        logger.warning(f"Prisma already connected or connection failed: {e}")
+    
+    sources = {
+        "share": 'SELECT "shareId" AS "id" FROM "File"',
+        "request": 'SELECT "requestId" AS "id" FROM "AccessRequest"'
+    }
+    result = {}
+    for kind, query in sources.items():
+        key, delta_key, next_key = filter_keys(kind)
+        
+        # 再構築中に追加されたIDは差分に記録され、差し替え時に合成される
+        redis_client.delete(delta_key)
+        rows = await prisma.query_raw(query)
+        
+        bloom = new_filter()
+        bloom.update(row["id"] for row in rows)
+        redis_client.set(next_key, bloom.to_bytes())
+        redis_client.eval(SWAP_SCRIPT, 3, next_key, delta_key, key)
+        result[kind] = len(rows)
+    
+    return result
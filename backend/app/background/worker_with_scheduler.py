@@ -9,6 +9,7 @@ import signal
 import sys
 import threading
 import time
+from datetime import datetime
 from pathlib import Path
 
 from apscheduler.schedulers.background import BackgroundScheduler
@@ -19,7 +20,8 @@ from dramatiq.cli import main as dramatiq_main
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
-from app.background.tasks import cleanup_expired_files_storage, cleanup_expired_upload_sessions
+from app.background.tasks import cleanup_expired_files_storage, cleanup_expired_upload_sessions, rebuild_id_filters
+from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
@@ -54,6 +56,16 @@ class WorkerWithScheduler:
             replace_existing=True
         )
         
+        # 共有ID・リクエストIDのBloomフィルター再構築（起動時と定期実行）
+        self.scheduler.add_job(
+            func=lambda: rebuild_id_filters.send(),
+            trigger=IntervalTrigger(minutes=settings.ID_FILTER_REBUILD_MINUTES),
+            id='rebuild_id_filters',
+            name='共有ID・リクエストIDのBloomフィルター再構築',
+            next_run_time=datetime.now(),
+            replace_existing=True
+        )
+        
         logger.info("定期タスクの設定が完了しました")
         
     def start_dramatiq_worker(self):
@@ -2,9 +2,15 @@
 from fastapi import HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional, Annotated
+import asyncio
+import hashlib
+import json
+import time
 import jwt
-import httpx
+from prisma.errors import UniqueViolationError
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.core.jwks import jwks_manager
 from app.core.database import prisma
 from app.schemas.auth import AuthUser
 import logging
@@ -19,7 +25,17 @@ class AuthService:
     def __init__(self):
         self.auth0_domain = settings.AUTH0_DOMAIN
         self.auth0_audience = settings.AUTH0_AUDIENCE
-        self._jwks_cache = None
+        # 検証済みトークン（SHA-256） -> AuthUser
+        self._token_cache = TTLCache(
+            maxsize=settings.AUTH_TOKEN_CACHE_SIZE,
+            ttl=settings.AUTH_TOKEN_CACHE_MAX_TTL
+        )
+        # ユーザーID -> (クレームのフィンガープリント, AuthUser)
+        self._user_cache = TTLCache(
+            maxsize=settings.AUTH_USER_CACHE_SIZE,
+            ttl=settings.AUTH_USER_CACHE_TTL
+        )
+        self._user_sync_tasks: dict[tuple[str, bytes], asyncio.Task] = {}
         
         # 初期化時に設定を確認
         logger.info(f"Auth0 Service initialized:")
@@ -29,25 +45,18 @@ class AuthService:
         if not self.auth0_domain or not self.auth0_audience:
             logger.error("Auth0 configuration missing! Check AUTH0_DOMAIN and AUTH0_AUDIENCE environment variables.")
     
-    async def get_auth0_jwks(self):
-        """Auth0のJWKSを取得（キャッシュ付き）"""
-        if self._jwks_cache is None:
-            jwks_url = f"https://{self.auth0_domain}/.well-known/jwks.json"
-            logger.info(f"Fetching JWKS from: {jwks_url}")
-            
-            try:
-                async with httpx.AsyncClient() as client:
-                    response = await client.get(jwks_url)
-                    response.raise_for_status()
-                    self._jwks_cache = response.json()
-                    logger.info(f"JWKS fetched successfully. Keys count: {len(self._jwks_cache.get('keys', []))}")
-            except Exception as e:
-                logger.error(f"Failed to fetch JWKS from {jwks_url}: {e}")
-                raise
-        return self._jwks_cache
-    
     async def verify_token(self, token: str) -> Optional[AuthUser]:
-        """Auth0 JWTトークンを検証してユーザー情報を返す"""
+        """
+        Auth0 JWTトークンを検証してユーザー情報を返す
+
+        検証済みのトークンはexpクレームの時刻まで（最大AUTH_TOKEN_CACHE_MAX_TTL秒）キャッシュし、
+        署名検証とDB参照を省略する
+        """
+        cache_key = hashlib.sha256(token.encode()).digest()
+        cached = self._token_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
             logger.info("Starting token verification")
             
@@ -68,17 +77,8 @@ class AuthService:
                 logger.warning(f"Unexpected JWT algorithm: {alg}. Expected RS256")
                 return None
             
-            # JWKSから対応する公開鍵を取得
-            jwks = await self.get_auth0_jwks()
-            rsa_key = None
-            available_kids = [key.get("kid") for key in jwks["keys"]]
-            logger.info(f"Available key IDs: {available_kids}")
-            
-            for key in jwks["keys"]:
-                if key["kid"] == kid:
-                    logger.info(f"Found matching key for kid: {kid}")
-                    rsa_key = jwt.algorithms.RSAAlgorithm.from_jwk(key)
-                    break
+            # JWKSから対応する公開鍵を取得（未知のkidの場合はJWKSを再取得）
+            rsa_key = await jwks_manager.get_key(kid)
             
             if not rsa_key:
                 logger.warning(f"Unable to find appropriate key for kid: {kid}")
@@ -109,47 +109,15 @@ class AuthService:
             user_name = payload.get("name", "")
             user_picture = payload.get("picture", "")
             
-            # データベースからユーザー情報を取得または作成
-            user = await prisma.user.find_unique(where={"id": user_id})
+            # データベースのユーザー情報を取得または作成（クレームが前回から変わっていなければDBを参照しない）
+            auth_user = await self.sync_user(user_id, user_email, user_name, user_picture)
             
-            if not user:
-                # Auth0ユーザーが初回ログインの場合、ユーザーを作成
-                # emailが空またはNullの場合は、user_idを基にした一意のemailを生成
-                if not user_email:
-                    user_email = f"user_{user_id.replace('|', '_')}@securepass.local"
-                
-                user = await prisma.user.create(
-                    data={
-                        "id": user_id,
-                        "email": user_email,
-                        "fullName": user_name,
-                        "avatarUrl": user_picture
-                    }
-                )
-                logger.info(f"Created new user: {user_id} with email: {user_email}")
-            else:
-                # 既存ユーザーの場合、情報を更新（Auth0側で変更があった場合に備えて）
-                updated_data = {}
-                if user_email and user_email != user.email:
-                    updated_data["email"] = user_email
-                if user_name and user_name != user.fullName:
-                    updated_data["fullName"] = user_name  
-                if user_picture and user_picture != user.avatarUrl:
-                    updated_data["avatarUrl"] = user_picture
-                
-                if updated_data:
-                    user = await prisma.user.update(
-                        where={"id": user_id},
-                        data=updated_data
-                    )
-                    logger.info(f"Updated user info for: {user_id}")
-            
-            return AuthUser(
-                id=user.id,
-                email=user.email or "",
-                full_name=user.fullName or "",
-                avatar_url=user.avatarUrl or ""
-            )
+            # トークンの有効期限を過ぎてキャッシュから返さないよう、TTLをexpまでに制限
+            ttl = min(payload["exp"] - time.time(), settings.AUTH_TOKEN_CACHE_MAX_TTL) if "exp" in payload else 0
+            if ttl > 0:
+                self._token_cache.set(cache_key, auth_user, ttl=ttl)
+            
+            return auth_user
             
         except jwt.ExpiredSignatureError:
             logger.warning("JWT token has expired")
@@ -168,6 +136,89 @@ class AuthService:
         except Exception as e:
             logger.error(f"Error verifying token: {e}")
             return None
+    
+    async def sync_user(self, user_id: str, email: str, name: str, picture: str) -> AuthUser:
+        """
+        トークンのクレームでユーザーを作成・更新し、ユーザー情報を返す
+
+        クレームのフィンガープリントをユーザーごとにキャッシュし、前回と同じクレームの場合はDBを参照しない。
+        同じユーザーの同時リクエストは1回の処理にまとめる
+        """
+        fingerprint = hashlib.sha256(json.dumps([email, name, picture]).encode()).digest()
+        cached = self._user_cache.get(user_id)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+        
+        key = (user_id, fingerprint)
+        task = self._user_sync_tasks.get(key)
+        if task is None:
+            task = asyncio.create_task(self._provision_user(user_id, email, name, picture))
+            self._user_sync_tasks[key] = task
+            task.add_done_callback(lambda _: self._user_sync_tasks.pop(key, None))
+        auth_user = await asyncio.shield(task)
+        self._user_cache.set(user_id, (fingerprint, auth_user))
+        return auth_user
+    
+    async def _provision_user(self, user_id: str, user_email: str, user_name: str, user_picture: str) -> AuthUser:
+        """ユーザーを取得し、存在しなければ作成、クレームが変わっていれば更新"""
+        user = await prisma.user.find_unique(where={"id": user_id})
+        
+        if not user:
+            # Auth0ユーザーが初回ログインの場合、ユーザーを作成
+            # emailが空またはNullの場合は、user_idを基にした一意のemailを生成
+            if not user_email:
+                user_email = f"user_{user_id.replace('|', '_')}@securepass.local"
+            
+            try:
+                user = await prisma.user.create(
+                    data={
+                        "id": user_id,
+                        "email": user_email,
+                        "fullName": user_name,
+                        "avatarUrl": user_picture
+                    }
+                )
+                logger.info(f"Created new user: {user_id} with email: {user_email}")
+            except UniqueViolationError:
+                # 他のプロセスが同時に作成した場合はそのユーザーを使う
+                user = await prisma.user.find_unique(where={"id": user_id})
+                if not user:
+                    raise
+        else:
+            # 既存ユーザーの場合、情報を更新（Auth0側で変更があった場合に備えて）
+            updated_data = {}
+            if user_email and user_email != user.email:
+                updated_data["email"] = user_email
+            if user_name and user_name != user.fullName:
+                updated_data["fullName"] = user_name  
+            if user_picture and user_picture != user.avatarUrl:
+                updated_data["avatarUrl"] = user_picture
+            
+            if updated_data:
+                user = await prisma.user.update(
+                    where={"id": user_id},
+                    data=updated_data
+                )
+                logger.info(f"Updated user info for: {user_id}")
+        
+        return AuthUser(
+            id=user.id,
+            email=user.email or "",
+            full_name=user.fullName or "",
+            avatar_url=user.avatarUrl or ""
+        )
+    
+    def invalidate_user(self, user_id: str):
+        """ユーザーのキャッシュ済みトークン・ユーザー情報を破棄（プロフィール変更・アカウント削除時）"""
+        self._token_cache.pop_where(lambda auth_user: auth_user.id == user_id)
+        self._user_cache.pop(user_id)
+    
+    def stats(self) -> dict:
+        """検証済みトークン・ユーザー情報キャッシュのヒット・ミス数"""
+        return {
+            "token": self._token_cache.stats(),
+            "user": self._user_cache.stats()
+        }
 
 
 auth_service = AuthService()
@@ -0,0 +1,57 @@
+from hashlib import blake2b
+from typing import Iterable
+import math
+
+
+class BloomFilter:
+    """
+    Bloomフィルター
+
+    ビット配列はRedisのビットマップ（SETBIT/GET）と同じく各バイトの上位ビットから並べるため、
+    Redisに保存したビットマップをそのまま読み込める。
+    サイズの異なるビットマップはビット位置が一致しないため ValueError とする
+    """
+
+    def __init__(self, size: int, hash_count: int, data: bytes | None = None):
+        self.size = size
+        self.hash_count = hash_count
+        self.bits = bytearray((size + 7) // 8)
+        if data is not None:
+            if len(data) != len(self.bits):
+                raise ValueError(f"Bloom filter data is {len(data)} bytes, expected {len(self.bits)}")
+            self.bits[:] = data
+
+    @staticmethod
+    def optimal_parameters(capacity: int, error_rate: float) -> tuple[int, int]:
+        """想定要素数と偽陽性率から(ビット数, ハッシュ数)を計算"""
+        size = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        hash_count = max(1, round(size / capacity * math.log(2)))
+        return size, hash_count
+
+    @staticmethod
+    def hash_positions(item: str, size: int, hash_count: int) -> list[int]:
+        """要素に対応するビット位置（ダブルハッシュ法）"""
+        digest = blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % size for i in range(hash_count)]
+
+    def positions(self, item: str) -> list[int]:
+        return self.hash_positions(item, self.size, self.hash_count)
+
+    def add(self, item: str):
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 0x80 >> (position & 7)
+
+    def update(self, items: Iterable[str]):
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (0x80 >> (position & 7))
+            for position in self.positions(item)
+        )
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.bits)
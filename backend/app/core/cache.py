@@ -0,0 +1,62 @@
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+import time
+
+
+class TTLCache:
+    """
+    プロセス内のTTL付きLRUキャッシュ
+
+    要素数がmaxsizeを超えると最も古く参照された要素から破棄する。
+    イベントループ上でのみ使用する前提のためロックは持たない
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """値を取得（存在しない・期限切れの場合はdefault）"""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """値を保存（ttlを省略した場合は既定のTTL）"""
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        """値を削除"""
+        self._data.pop(key, None)
+
+    def pop_where(self, predicate: Callable[[Any], bool]):
+        """条件に一致する値をすべて削除（全要素を走査するため頻繁には呼ばない）"""
+        for key in [key for key, (_, value) in self._data.items() if predicate(value)]:
+            del self._data[key]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """ヒット・ミス数などの統計"""
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
@@ -18,13 +18,31 @@ class Settings(BaseSettings):
     
     # Redis
     REDIS_URL: str = os.environ["REDIS_URL"]
+    REDIS_SOCKET_TIMEOUT: float = 2.0  # 秒
 
     # Cloudflare R2
     R2_ENDPOINT: str = os.environ["R2_ENDPOINT"]
     R2_ACCESS_KEY_ID: str = os.environ["R2_ACCESS_KEY_ID"]
     R2_SECRET_ACCESS_KEY: str = os.environ["R2_SECRET_ACCESS_KEY"]
     R2_BUCKET_NAME: str = os.environ["R2_BUCKET_NAME"]
-    
+
+    # R2クライアントのコネクションプール設定
+    R2_MAX_POOL_CONNECTIONS: int = 50
+    R2_KEEPALIVE_TIMEOUT: int = 60  # 秒
+    R2_CONNECT_TIMEOUT: int = 5  # 秒
+    R2_READ_TIMEOUT: int = 60  # 秒
+    R2_OPERATION_TIMEOUT: int = 120  # 秒（1操作あたりの上限）
+    R2_MAX_ATTEMPTS: int = 3
+    R2_COMPOSE_CONCURRENCY: int = 8  # UploadPartCopyの並列数
+
+    # ダウンロード設定
+    # stream: APIがR2から取得して中継 / redirect: 署名付きURLへ302リダイレクト（R2から直接取得）
+    DOWNLOAD_MODE: Literal["stream", "redirect"] = "stream"
+    DOWNLOAD_URL_EXPIRES_SECONDS: int = 60
+    # 結合していないチャンク形式のファイルで先読みするチャンク数とメモリ上限
+    DOWNLOAD_PREFETCH_CHUNKS: int = 4
+    DOWNLOAD_PREFETCH_MEMORY: int = 32 * 1024 * 1024  # 32MB
+
     # CORS
     ALLOWED_ORIGINS: list[str] = [
         "http://localhost:3000",
@@ -36,6 +54,50 @@ class Settings(BaseSettings):
     MAX_FILE_SIZE: int = 500 * 1024 * 1024  # 500MB
     CHUNK_SIZE: int = 5 * 1024 * 1024  # 5MB
     UPLOAD_SESSION_EXPIRE_HOURS: int = 24
+    CHUNK_URL_WINDOW_SIZE: int = 32  # 一度に発行する署名付きURL数
+    CHUNK_URL_MAX_WINDOW_SIZE: int = 128
+    CHUNK_URL_EXPIRES_SECONDS: int = 3600
+    CHUNK_SPOOL_MAX_MEMORY: int = 1 * 1024 * 1024  # 超えた分は一時ファイルに退避
+    COMPOSE_CHUNKS_ON_COMPLETE: bool = False  # Falseの場合はチャンクのまま保存し、ダウンロード時に連結して配信
+    UPLOAD_SESSION_CACHE_SIZE: int = 10000  # プロセス内にキャッシュするセッション数
+    UPLOAD_SESSION_CACHE_TTL: int = 300  # 秒
+
+    # 共有情報キャッシュ
+    SHARE_CACHE_TTL: int = 300  # Redis上のTTL（秒）
+    SHARE_CACHE_LOCAL_SIZE: int = 10000
+    SHARE_CACHE_LOCAL_TTL: int = 5  # プロセス内キャッシュのTTL（秒、他プロセスでの無効化の反映遅延の上限）
+
+    # 一覧のページング
+    MAX_PAGE_SIZE: int = 100
+    PAGE_TOTAL_CACHE_SIZE: int = 10000
+    PAGE_TOTAL_CACHE_TTL: int = 30  # 総件数（概算）をキャッシュする秒数
+
+    # 存在しない共有ID・リクエストIDの判定（Bloomフィルター・ネガティブキャッシュ）
+    ID_FILTER_CAPACITY: int = 1_000_000  # 想定ID数（種類ごと）
+    ID_FILTER_ERROR_RATE: float = 0.001
+    ID_FILTER_REFRESH_SECONDS: int = 60  # プロセス内フィルターをRedisから再読み込みする間隔
+    ID_FILTER_REBUILD_MINUTES: int = 60  # ワーカーがDBからフィルターを再構築する間隔
+    NEGATIVE_CACHE_SIZE: int = 10000
+    NEGATIVE_CACHE_TTL: int = 60  # 秒
+
+    # 匿名エンドポイントのレート制限（IPアドレスごと、"回数/秒数"）
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMITS: dict[str, str] = {
+        "get_share_info": "120/60",
+        "create_access_request": "10/60",
+        "get_request_status": "60/60",
+        "get_request_events": "30/60",
+        "download_file": "30/60",
+        "get_decrypt_key": "30/60",
+    }
+    RATE_LIMIT_LOCAL_SIZE: int = 100000  # Redis停止時にプロセス内で保持するバケット数
+    RATE_LIMIT_REDIS_RETRY_SECONDS: int = 5  # Redisエラー後にRedisへの問い合わせを止める秒数
+
+    # イベント配信（Redis Pub/Sub・Server-Sent Events）
+    EVENT_QUEUE_SIZE: int = 32  # 接続ごとの未送信イベント数の上限（超えた接続は切断）
+    EVENT_RECONNECT_SECONDS: int = 1  # Pub/Sub接続が切れた場合の再接続間隔
+    SSE_KEEPALIVE_SECONDS: int = 15  # イベントがない間にコメント行を送る間隔
+    SSE_MAX_CONNECTION_SECONDS: int = 300  # 1接続の最大時間（クライアントは再接続する）
     
     
     # セキュリティ用Salt
@@ -44,6 +106,13 @@ class Settings(BaseSettings):
     # Auth0認証
     AUTH0_DOMAIN: str = os.environ["AUTH0_DOMAIN"]
     AUTH0_AUDIENCE: str = os.environ["AUTH0_AUDIENCE"]
+    JWKS_CACHE_TTL: int = 3600  # JWKSを再取得する間隔（秒）
+    JWKS_MIN_REFRESH_SECONDS: int = 30  # 未知のkid・取得失敗による再取得の最短間隔
+    JWKS_FETCH_TIMEOUT: float = 5.0
+    AUTH_TOKEN_CACHE_SIZE: int = 10000  # 検証済みトークンをキャッシュする数
+    AUTH_TOKEN_CACHE_MAX_TTL: int = 300  # トークンの有効期限より前でもこの秒数でキャッシュを破棄
+    AUTH_USER_CACHE_SIZE: int = 10000  # クレームのフィンガープリントをキャッシュするユーザー数
+    AUTH_USER_CACHE_TTL: int = 300  # 他プロセスでのユーザー変更・削除の反映遅延の上限（秒）
 
 
     class Config:
@@ -0,0 +1,109 @@
+from typing import Any, Optional
+import asyncio
+import logging
+import time
+import httpx
+import jwt
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class JWKSManager:
+    """
+    JWKS（JWTの署名検証用公開鍵セット）の取得・キャッシュ
+
+    - kid -> 公開鍵 の辞書を保持し、JWKS_CACHE_TTL秒ごとに再取得する（鍵のローテーションに追従）
+    - 未知のkidの場合も再取得するが、JWKS_MIN_REFRESH_SECONDS秒に1回までに制限する
+      （不正なkidを大量に送られてもJWKSの取得元に負荷をかけない）
+    - 同時に必要になった取得は1回のリクエストにまとめる
+    - 取得に失敗した場合は取得済みの鍵を使い続ける
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self._keys: dict[str, Any] = {}
+        self._fetched_at: Optional[float] = None
+        self._attempted_at: Optional[float] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self.fetches = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=settings.JWKS_FETCH_TIMEOUT)
+        return self._client
+
+    def _can_refresh(self) -> bool:
+        return self._attempted_at is None or time.monotonic() - self._attempted_at >= settings.JWKS_MIN_REFRESH_SECONDS
+
+    def _is_stale(self) -> bool:
+        return self._fetched_at is None or time.monotonic() - self._fetched_at >= settings.JWKS_CACHE_TTL
+
+    @staticmethod
+    def parse_keys(jwks: dict) -> dict[str, Any]:
+        """JWKSから署名検証用のRSA公開鍵を kid -> 鍵 の辞書にする"""
+        keys = {}
+        for jwk in jwks.get("keys", []):
+            kid = jwk.get("kid")
+            if not kid or jwk.get("kty") != "RSA" or jwk.get("use", "sig") != "sig":
+                continue
+            try:
+                keys[kid] = jwt.algorithms.RSAAlgorithm.from_jwk(jwk)
+            except (jwt.InvalidKeyError, ValueError, KeyError) as e:
+                logger.warning(f"Ignoring invalid JWK {kid}: {e}")
+        return keys
+
+    async def _fetch(self):
+        self.fetches += 1
+        logger.info(f"Fetching JWKS from: {self.url}")
+        response = await self._get_client().get(self.url)
+        response.raise_for_status()
+        keys = self.parse_keys(response.json())
+        if not keys:
+            raise ValueError("JWKS contains no usable keys")
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+        logger.info(f"JWKS fetched successfully. Key IDs: {list(keys)}")
+
+    async def refresh(self):
+        """JWKSを再取得（取得中の場合は完了を待つ）"""
+        task = self._refresh_task
+        if task is None or task.done():
+            self._attempted_at = time.monotonic()
+            task = self._refresh_task = asyncio.create_task(self._fetch())
+        # 待っているリクエストがキャンセルされても取得自体は継続する
+        await asyncio.shield(task)
+
+    async def _refresh_if_allowed(self):
+        """取得中ならその完了を待ち、そうでなければ間隔の制限内で再取得（失敗は記録のみ）"""
+        in_flight = self._refresh_task is not None and not self._refresh_task.done()
+        if not in_flight and not self._can_refresh():
+            return
+        try:
+            await self.refresh()
+        except (httpx.HTTPError, ValueError) as e:
+            logger.error(f"Failed to fetch JWKS from {self.url}: {e}")
+
+    async def get_key(self, kid: str) -> Optional[Any]:
+        """kidに対応する公開鍵を取得（見つからない場合はNone）"""
+        if self._is_stale():
+            await self._refresh_if_allowed()
+
+        key = self._keys.get(kid)
+        if key is None:
+            # 鍵のローテーション直後の可能性があるため再取得
+            await self._refresh_if_allowed()
+            key = self._keys.get(kid)
+        return key
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        return {"keys": len(self._keys), "fetches": self.fetches}
+
+
+jwks_manager = JWKSManager(f"https://{settings.AUTH0_DOMAIN}/.well-known/jwks.json")
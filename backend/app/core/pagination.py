@@ -0,0 +1,88 @@
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Optional
+import base64
+import json
+from fastapi import HTTPException, status
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+# (createdAt, id) の降順（idは作成日時が同じレコードの順序を一意にする）
+KEYSET_ORDER = [{"createdAt": "desc"}, {"id": "desc"}]
+
+_total_cache = TTLCache(
+    maxsize=settings.PAGE_TOTAL_CACHE_SIZE,
+    ttl=settings.PAGE_TOTAL_CACHE_TTL
+)
+
+
+def encode_cursor(created_at: datetime, id: str) -> str:
+    """ページの最後のレコードから次ページのカーソルを作成"""
+    value = json.dumps([created_at.isoformat(), id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """カーソルを (createdAt, id) に変換（不正な値の場合は400）"""
+    try:
+        value = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id = json.loads(value)
+        return datetime.fromisoformat(created_at), str(id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def keyset_where(where: dict, cursor: Optional[str]) -> dict:
+    """カーソルより後（KEYSET_ORDER順）のレコードに絞り込む条件を追加"""
+    if not cursor:
+        return where
+    created_at, id = decode_cursor(cursor)
+    return {
+        **where,
+        "OR": [
+            {"createdAt": {"lt": created_at}},
+            {"createdAt": created_at, "id": {"lt": id}}
+        ]
+    }
+
+
+async def fetch_page(
+    model: Any,
+    where: dict,
+    limit: int,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    **kwargs
+) -> tuple[list, Optional[str]]:
+    """
+    KEYSET_ORDER順に1ページ分のレコードを取得し、(レコード, 次ページのカーソル)を返す
+
+    limit+1件を取得して次ページの有無を判定する（次ページがなければカーソルはNone）
+    """
+    records = await model.find_many(
+        where=keyset_where(where, cursor),
+        take=limit + 1,
+        skip=skip,
+        order=KEYSET_ORDER,
+        **kwargs
+    )
+    if len(records) <= limit:
+        return records, None
+    records = records[:limit]
+    last = records[-1]
+    return records, encode_cursor(last.createdAt, last.id)
+
+
+async def cached_total(key: tuple, count: Callable[[], Awaitable[int]]) -> int:
+    """
+    総件数（概算）を取得
+
+    PAGE_TOTAL_CACHE_TTL秒間はキャッシュした値を返すため、直近の追加・削除は反映されないことがある
+    """
+    total = _total_cache.get(key)
+    if total is None:
+        total = await count()
+        _total_cache.set(key, total)
+    return total
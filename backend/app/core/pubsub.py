@@ -0,0 +1,229 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import AsyncIterator, Callable, Optional
+import asyncio
+import json
+import logging
+import time
+from redis.exceptions import RedisError
+from app.core.config import settings
+from app.core.redis import redis_client, redis_pubsub_client
+
+logger = logging.getLogger(__name__)
+
+EVENT_CHANNEL_PREFIX = "events:"
+
+# SSEレスポンスのヘッダー（プロキシでのバッファリング・キャッシュを無効化）
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no"
+}
+
+
+def request_channel(request_id: str) -> str:
+    """アクセスリクエストのステータス変更を通知するチャンネル"""
+    return f"{EVENT_CHANNEL_PREFIX}request:{request_id}"
+
+
+def user_channel(user_id: str) -> str:
+    """ファイル所有者への通知（リクエスト作成・ダウンロード開始・期限切れ）のチャンネル"""
+    return f"{EVENT_CHANNEL_PREFIX}user:{user_id}"
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_event(event: str, data: dict) -> str:
+    """Pub/Subで送るメッセージ（ワーカーなど同期クライアントからの送信にも使う）"""
+    return json.dumps({"event": event, "data": data}, default=_json_default)
+
+
+def format_sse(event: dict) -> str:
+    """イベントをServer-Sent Events形式に変換"""
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'], default=_json_default)}\n\n"
+
+
+class Subscription:
+    """1接続分のイベントキュー"""
+
+    def __init__(self, hub: "EventHub", channel: str):
+        self.channel = channel
+        self._hub = hub
+        self._queue: asyncio.Queue[Optional[dict]] = asyncio.Queue(maxsize=settings.EVENT_QUEUE_SIZE)
+
+    def put(self, event: dict) -> bool:
+        """イベントを追加（キューが一杯の場合はFalse）"""
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def drop(self):
+        """未送信のイベントを破棄し、受信側に切断を通知"""
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        """
+        次のイベントを取得（切断された場合はNone）
+
+        timeout秒以内にイベントがなければ asyncio.TimeoutError
+        """
+        return await asyncio.wait_for(self._queue.get(), timeout)
+
+    def close(self):
+        self._hub.unsubscribe(self)
+
+
+class EventHub:
+    """
+    Redis Pub/Subのイベントをプロセス内の接続に配信する
+
+    プロセスごとに1つのPub/Sub接続で全イベントチャンネルをパターン購読し、
+    チャンネルごとの購読者のキューに振り分ける。キューが一杯になった（読み出しが遅い）接続は
+    イベントを溜め続けずに切断する。Pub/Sub接続が切れている間のイベントは届かないため、
+    接続側は購読後に現在の状態を読み込み、SSE_MAX_CONNECTION_SECONDSごとに再接続させる
+    """
+
+    def __init__(self):
+        self._subscribers: dict[str, set[Subscription]] = defaultdict(set)
+        self._task: Optional[asyncio.Task] = None
+        self._ready: Optional[asyncio.Event] = None
+        self.delivered = 0
+        self.dropped = 0
+
+    async def _listen(self):
+        while True:
+            pubsub = redis_pubsub_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(f"{EVENT_CHANNEL_PREFIX}*")
+                self._ready.set()
+                async for message in pubsub.listen():
+                    if message["type"] == "pmessage":
+                        self._dispatch(message["channel"], message["data"])
+            except (RedisError, OSError) as e:
+                logger.warning(f"Event subscription lost: {e}")
+            finally:
+                self._ready.clear()
+                await pubsub.aclose()
+            await asyncio.sleep(settings.EVENT_RECONNECT_SECONDS)
+
+    def _dispatch(self, channel: str, data: str):
+        subscribers = self._subscribers.get(channel)
+        if not subscribers:
+            return
+        try:
+            event = json.loads(data)
+        except ValueError:
+            logger.warning(f"Ignoring malformed event on {channel}")
+            return
+        for subscription in list(subscribers):
+            if subscription.put(event):
+                self.delivered += 1
+            else:
+                logger.warning(f"Dropping slow event subscriber on {channel}")
+                self.dropped += 1
+                self.unsubscribe(subscription)
+                subscription.drop()
+
+    async def subscribe(self, channel: str) -> Subscription:
+        """チャンネルを購読（不要になったら Subscription.close を呼ぶ）"""
+        if self._task is None or self._task.done():
+            self._ready = asyncio.Event()
+            self._task = asyncio.create_task(self._listen())
+
+        subscription = Subscription(self, channel)
+        self._subscribers[channel].add(subscription)
+
+        # Pub/Subの購読開始前に発行されたイベントを取りこぼさないよう待つ
+        # （Redisに到達できない場合も接続側は現在の状態を返せるよう、待ち時間を制限する）
+        try:
+            await asyncio.wait_for(self._ready.wait(), settings.REDIS_SOCKET_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Event subscription is not ready")
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.channel)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.channel]
+
+    async def publish(self, channel: str, event: str, data: dict):
+        """イベントを発行（失敗しても呼び出し元の処理は継続する）"""
+        try:
+            await redis_client.publish(channel, encode_event(event, data))
+        except RedisError as e:
+            logger.warning(f"Failed to publish {event} event: {e}")
+
+    async def publish_many(self, events: list[tuple[str, str, dict]]):
+        """(チャンネル, イベント名, データ)の一覧を1往復で発行"""
+        if not events:
+            return
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for channel, event, data in events:
+                    pipe.publish(channel, encode_event(event, data))
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Failed to publish {len(events)} events: {e}")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+            "delivered": self.delivered,
+            "dropped": self.dropped
+        }
+
+
+event_hub = EventHub()
+
+
+async def sse_stream(
+    subscription: Subscription,
+    initial: list[dict],
+    is_final: Callable[[dict], bool] = lambda event: False
+) -> AsyncIterator[str]:
+    """
+    購読したイベントをSSEとして送信し、終了時に購読を解除する
+
+    - initial のイベントを先に送る
+    - is_final がTrueを返すイベントを送ったら終了する
+    - イベントがない間はコメント行を送って接続を維持し、SSE_MAX_CONNECTION_SECONDS で終了する
+    """
+    try:
+        for event in initial:
+            yield format_sse(event)
+            if is_final(event):
+                return
+
+        deadline = time.monotonic() + settings.SSE_MAX_CONNECTION_SECONDS
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                event = await subscription.get(min(settings.SSE_KEEPALIVE_SECONDS, remaining))
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if event is None:
+                return
+            yield format_sse(event)
+            if is_final(event):
+                return
+    finally:
+        subscription.close()
@@ -0,0 +1,136 @@
+from dataclasses import dataclass
+from typing import Callable
+import logging
+import math
+import time
+from fastapi import HTTPException, Request, status
+from redis.exceptions import RedisError
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.redis import redis_client
+from app.core.security import security
+
+logger = logging.getLogger(__name__)
+
+# トークンバケットを1往復で更新し、{許可(1/0), 残りトークン, 再試行までのミリ秒}を返す
+# 時刻はRedisサーバーの時刻を使い、APIサーバー間の時計のずれの影響を受けない
+# KEYS[1]: バケット / ARGV[1]: 容量, ARGV[2]: 補充間隔（ミリ秒/トークン）
+_TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+if tokens == nil then
+    tokens = capacity
+    ts = now
+end
+
+tokens = math.min(capacity, tokens + (now - ts) / interval)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = math.ceil((1 - tokens) * interval)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * interval))
+return {allowed, math.floor(tokens), retry_after}
+"""
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """period秒あたりcapacity回（capacity回までのバーストを許容）"""
+    capacity: int
+    period: float
+
+    @classmethod
+    def parse(cls, value: str) -> "RateLimit":
+        """「回数/秒数」形式（例: "10/60"）を解析"""
+        capacity, period = value.split("/")
+        return cls(int(capacity), float(period))
+
+    @property
+    def interval_ms(self) -> float:
+        """1トークンの補充にかかるミリ秒"""
+        return self.period * 1000 / self.capacity
+
+
+class RateLimiter:
+    """
+    IPアドレス（ハッシュ値）ごとのトークンバケットによるレート制限
+
+    Redis上のバケットをLuaスクリプト1往復で更新する。Redisに到達できない場合は一定時間
+    Redisへの問い合わせを止め、プロセス内のバケットで制限する（プロセス数倍まで緩くなる）
+    """
+
+    def __init__(self):
+        self._script = redis_client.register_script(_TOKEN_BUCKET_SCRIPT)
+        # (バケットキー) -> (トークン数, 更新時刻ミリ秒)
+        self._local = TTLCache(
+            maxsize=settings.RATE_LIMIT_LOCAL_SIZE,
+            ttl=max((RateLimit.parse(v).period for v in settings.RATE_LIMITS.values()), default=60)
+        )
+        self._redis_retry_at = 0.0
+
+    def _take_local(self, key: str, limit: RateLimit) -> tuple[bool, int]:
+        """プロセス内のバケットからトークンを取得し、(許可, 再試行までのミリ秒)を返す"""
+        now = time.monotonic() * 1000
+        tokens, ts = self._local.get(key, (limit.capacity, now))
+        tokens = min(limit.capacity, tokens + (now - ts) / limit.interval_ms)
+        if tokens >= 1:
+            self._local.set(key, (tokens - 1, now))
+            return True, 0
+        self._local.set(key, (tokens, now))
+        return False, math.ceil((1 - tokens) * limit.interval_ms)
+
+    async def take(self, name: str, client_key: str, limit: RateLimit) -> tuple[bool, int]:
+        """ルートnameのバケットからトークンを1つ取得し、(許可, 再試行までのミリ秒)を返す"""
+        key = f"rate_limit:{name}:{client_key}"
+
+        if time.monotonic() >= self._redis_retry_at:
+            try:
+                allowed, _, retry_after = await self._script(
+                    keys=[key],
+                    args=[limit.capacity, limit.interval_ms]
+                )
+                return bool(allowed), int(retry_after)
+            except RedisError as e:
+                logger.warning(f"Rate limiter falling back to local buckets: {e}")
+                self._redis_retry_at = time.monotonic() + settings.RATE_LIMIT_REDIS_RETRY_SECONDS
+
+        return self._take_local(key, limit)
+
+
+rate_limiter = RateLimiter()
+
+
+def rate_limit(name: str) -> Callable:
+    """
+    ルートごとのレート制限を行うFastAPI依存関数を作成
+
+    制限値は settings.RATE_LIMITS[name] で設定する
+    """
+    if name not in settings.RATE_LIMITS:
+        raise ValueError(f"Rate limit for '{name}' is not configured")
+    limit = RateLimit.parse(settings.RATE_LIMITS[name])
+
+    async def dependency(req: Request):
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+        allowed, retry_after_ms = await rate_limiter.take(name, security.hash_ip(req.client.host), limit)
+        if not allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after_ms / 1000)))}
+            )
+
+    return dependency
@@ -0,0 +1,25 @@
+from redis.asyncio import Redis
+from app.core.config import settings
+
+# アプリケーション全体で共有するRedisクライアント（内部でコネクションプールを持つ）
+redis_client = Redis.from_url(
+    settings.REDIS_URL,
+    decode_responses=True,
+    socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT
+)
+
+# ビットマップなどバイナリ値を扱うクライアント（レスポンスをデコードしない）
+redis_binary_client = Redis.from_url(
+    settings.REDIS_URL,
+    socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT
+)
+
+# Pub/Sub購読用クライアント（イベントを待ち続けるため読み取りタイムアウトを設定しない）
+redis_pubsub_client = Redis.from_url(
+    settings.REDIS_URL,
+    decode_responses=True,
+    socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    health_check_interval=30
+)
@@ -1,154 +1,490 @@
-# backend/app/core/storage.py
+import asyncio
+from contextlib import AsyncExitStack
+from typing import Any, BinaryIO, Iterable, Optional
 import aioboto3
-from botocore.exceptions import ClientError
+import botocore.session
+from aiobotocore.config import AioConfig
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
 from app.core.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+# S3互換マルチパートアップロードのパート最小サイズ（最終パートを除く）
+MIN_PART_SIZE = 5 * 1024 * 1024
+# マルチパートアップロードのパート数上限
+MAX_PARTS = 10000
+# DeleteObjectsで1リクエストあたりに指定できるキー数の上限
+MAX_DELETE_KEYS = 1000
+# ストレージ操作の失敗として扱う例外（APIのエラー・接続やエンドポイントのエラー・タイムアウト）
+STORAGE_ERRORS = (ClientError, BotoCoreError, asyncio.TimeoutError)
+
+
+def group_parts(sizes: list[int]) -> list[tuple[int, int]]:
+    """
+    連続するソースを最小パートサイズ以上になるようまとめた(開始, 終了)の一覧
+
+    サイズが揃っていなくても、最終以外の各パートが MIN_PART_SIZE 以上になる
+    """
+    groups = []
+    start = 0
+    total = 0
+    for index, size in enumerate(sizes):
+        total += size
+        if total >= MIN_PART_SIZE:
+            groups.append((start, index + 1))
+            start = index + 1
+            total = 0
+    if start < len(sizes):
+        groups.append((start, len(sizes)))
+    return groups
+
 
 class R2Storage:
     """Cloudflare R2ストレージ操作"""
-    
+
     def __init__(self):
         self.endpoint = settings.R2_ENDPOINT
         self.access_key_id = settings.R2_ACCESS_KEY_ID
         self.secret_access_key = settings.R2_SECRET_ACCESS_KEY
         self.bucket_name = settings.R2_BUCKET_NAME
+        self.operation_timeout = settings.R2_OPERATION_TIMEOUT
         self.session = aioboto3.Session()
-    
-    async def generate_presigned_url(
-        self, 
-        key: str, 
-        operation: str = 'put_object',
-        expires_in: int = 3600
-    ) -> str:
-        """署名付きURLを生成"""
-        async with self.session.client(
-            's3',
-            endpoint_url=self.endpoint,
-            aws_access_key_id=self.access_key_id,
-            aws_secret_access_key=self.secret_access_key,
-            region_name='auto'
-        ) as client:
+        self.config = AioConfig(
+            max_pool_connections=settings.R2_MAX_POOL_CONNECTIONS,
+            connect_timeout=settings.R2_CONNECT_TIMEOUT,
+            read_timeout=settings.R2_READ_TIMEOUT,
+            retries={"max_attempts": settings.R2_MAX_ATTEMPTS, "mode": "standard"},
+            connector_args={"keepalive_timeout": settings.R2_KEEPALIVE_TIMEOUT}
+        )
+        self._client = None
+        self._exit_stack: Optional[AsyncExitStack] = None
+        self._lock = asyncio.Lock()
+        self._signer = None
+
+    async def connect(self):
+        """
+        S3クライアントを開く
+
+        クライアントは内部でコネクションプールを保持するため、
+        プロセス（イベントループ）ごとに1つを使い回す
+        """
+        async with self._lock:
+            if self._client is not None:
+                return
+            exit_stack = AsyncExitStack()
+            self._client = await exit_stack.enter_async_context(
+                self.session.client(
+                    's3',
+                    endpoint_url=self.endpoint,
+                    aws_access_key_id=self.access_key_id,
+                    aws_secret_access_key=self.secret_access_key,
+                    region_name='auto',
+                    config=self.config
+                )
+            )
+            self._exit_stack = exit_stack
+            logger.info("R2 client connected")
+
+    async def disconnect(self):
+        """S3クライアントを閉じる"""
+        async with self._lock:
+            if self._exit_stack is None:
+                return
             try:
-                url = await client.generate_presigned_url(
+                await self._exit_stack.aclose()
+            finally:
+                self._client = None
+                self._exit_stack = None
+                logger.info("R2 client disconnected")
+
+    def is_connected(self) -> bool:
+        return self._client is not None
+
+    async def get_client(self):
+        """プール済みのS3クライアントを取得（未接続の場合は接続する）"""
+        if self._client is None:
+            await self.connect()
+        return self._client
+
+    async def _call(self, method: str, **kwargs):
+        """タイムアウト付きでS3 APIを呼び出す"""
+        client = await self.get_client()
+        return await asyncio.wait_for(
+            getattr(client, method)(**kwargs),
+            timeout=self.operation_timeout
+        )
+
+    def _get_signer(self):
+        """
+        署名専用の同期クライアントを取得
+
+        署名付きURLの生成はローカルの計算のみで完結するため、
+        ネットワーク接続を持たないbotocoreクライアントを1つだけ作って使い回す
+        """
+        if self._signer is None:
+            self._signer = botocore.session.get_session().create_client(
+                's3',
+                endpoint_url=self.endpoint,
+                aws_access_key_id=self.access_key_id,
+                aws_secret_access_key=self.secret_access_key,
+                region_name='auto',
+                config=Config(signature_version='s3v4')
+            )
+        return self._signer
+
+    def presign_many(
+        self,
+        keys: Iterable[str],
+        operation: str = 'put_object',
+        expires_in: int = 3600,
+        params: Optional[dict[str, Any]] = None
+    ) -> list[str]:
+        """複数キーの署名付きURLを一括生成（ネットワーク通信なし）"""
+        signer = self._get_signer()
+        extra_params = params or {}
+        try:
+            return [
+                signer.generate_presigned_url(
                     ClientMethod=operation,
+                    Params={'Bucket': self.bucket_name, 'Key': key, **extra_params},
+                    ExpiresIn=expires_in
+                )
+                for key in keys
+            ]
+        except (ClientError, BotoCoreError) as e:
+            logger.error(f"Failed to generate presigned URLs: {e}")
+            raise
+
+    def presign_upload_parts(
+        self,
+        key: str,
+        upload_id: str,
+        part_numbers: Iterable[int],
+        expires_in: int = 3600
+    ) -> list[str]:
+        """マルチパートアップロードの各パート用署名付きURLを一括生成（ネットワーク通信なし）"""
+        signer = self._get_signer()
+        try:
+            return [
+                signer.generate_presigned_url(
+                    ClientMethod='upload_part',
                     Params={
                         'Bucket': self.bucket_name,
-                        'Key': key
+                        'Key': key,
+                        'UploadId': upload_id,
+                        'PartNumber': part_number
                     },
                     ExpiresIn=expires_in
                 )
-                return url
-            except ClientError as e:
-                logger.error(f"Failed to generate presigned URL: {e}")
-                raise
-    
-    async def upload_chunk(self, key: str, data: bytes) -> bool:
-        """チャンクをアップロード"""
-        async with self.session.client(
-            's3',
-            endpoint_url=self.endpoint,
-            aws_access_key_id=self.access_key_id,
-            aws_secret_access_key=self.secret_access_key,
-            region_name='auto'
-        ) as client:
-            try:
-                await client.put_object(
-                    Bucket=self.bucket_name,
-                    Key=key,
-                    Body=data,
-                    ContentType='application/octet-stream'
-                )
-                return True
-            except ClientError as e:
-                logger.error(f"Failed to upload chunk: {e}")
-                return False
-    
-    async def download_chunk(self, key: str) -> bytes:
-        """チャンクをダウンロード"""
-        async with self.session.client(
-            's3',
-            endpoint_url=self.endpoint,
-            aws_access_key_id=self.access_key_id,
-            aws_secret_access_key=self.secret_access_key,
-            region_name='auto'
-        ) as client:
+                for part_number in part_numbers
+            ]
+        except (ClientError, BotoCoreError) as e:
+            logger.error(f"Failed to generate presigned part URLs: {e}")
+            raise
+
+    async def generate_presigned_url(
+        self,
+        key: str,
+        operation: str = 'put_object',
+        expires_in: int = 3600,
+        params: Optional[dict[str, Any]] = None
+    ) -> str:
+        """署名付きURLを生成"""
+        return self.presign_many([key], operation, expires_in, params)[0]
+
+    async def upload_chunk(self, key: str, data: bytes | BinaryIO) -> bool:
+        """チャンクをアップロード（bytesまたはシーク可能なファイルオブジェクト）"""
+        try:
+            await self._call(
+                'put_object',
+                Bucket=self.bucket_name,
+                Key=key,
+                Body=data,
+                ContentType='application/octet-stream'
+            )
+            return True
+        except STORAGE_ERRORS as e:
+            logger.error(f"Failed to upload chunk: {e!r}")
+            return False
+
+    async def download_chunk(self, key: str, byte_range: Optional[tuple[int, int]] = None) -> bytes:
+        """チャンクをダウンロード（byte_rangeで部分取得、終了位置を含む）"""
+        params = {'Bucket': self.bucket_name, 'Key': key}
+        if byte_range:
+            params['Range'] = f"bytes={byte_range[0]}-{byte_range[1]}"
+        try:
+            response = await self._call('get_object', **params)
+            async with response['Body'] as body:
+                data = await asyncio.wait_for(body.read(), timeout=self.operation_timeout)
+            return data
+        except STORAGE_ERRORS as e:
+            logger.error(f"Failed to download chunk: {e!r}")
+            return None
+
+    async def upload_file(self, key: str, data: bytes) -> bool:
+        """ファイルをアップロード"""
+        try:
+            await self._call(
+                'put_object',
+                Bucket=self.bucket_name,
+                Key=key,
+                Body=data,
+                ContentType='application/octet-stream'
+            )
+            return True
+        except STORAGE_ERRORS as e:
+            logger.error(f"Failed to upload file: {e!r}")
+            return False
+
+    async def delete_object(self, key: str) -> bool:
+        """オブジェクトを削除"""
+        try:
+            await self._call(
+                'delete_object',
+                Bucket=self.bucket_name,
+                Key=key
+            )
+            return True
+        except STORAGE_ERRORS as e:
+            logger.error(f"Failed to delete object: {e!r}")
+            return False
+
+    async def delete_chunk(self, key: str) -> bool:
+        """チャンクを削除"""
+        return await self.delete_object(key)
+
+    async def delete_objects(self, keys: list[str]) -> bool:
+        """複数オブジェクトを一括削除（1000件ずつDeleteObjectsを発行）"""
+        success = True
+        for start in range(0, len(keys), MAX_DELETE_KEYS):
+            batch = keys[start:start + MAX_DELETE_KEYS]
             try:
-                response = await client.get_object(
+                response = await self._call(
+                    'delete_objects',
                     Bucket=self.bucket_name,
-                    Key=key
+                    Delete={
+                        'Objects': [{'Key': key} for key in batch],
+                        'Quiet': True
+                    }
                 )
-                data = await response['Body'].read()
-                return data
-            except ClientError as e:
-                logger.error(f"Failed to download chunk: {e}")
-                return None
-    
-    async def upload_file(self, key: str, data: bytes) -> bool:
-        """ファイルをアップロード"""
-        async with self.session.client(
-            's3',
-            endpoint_url=self.endpoint,
-            aws_access_key_id=self.access_key_id,
-            aws_secret_access_key=self.secret_access_key,
-            region_name='auto'
-        ) as client:
+                for error in response.get('Errors', []):
+                    logger.error(f"Failed to delete object {error.get('Key')}: {error.get('Message')}")
+                    success = False
+            except STORAGE_ERRORS as e:
+                logger.error(f"Failed to delete objects: {e!r}")
+                success = False
+        return success
+
+    async def compose_object(self, key: str, source_keys: list[str], source_sizes: list[int]) -> bool:
+        """
+        複数オブジェクトを連結して1つのオブジェクトを作成
+
+        マルチパートアップロードのUploadPartCopyでサーバー側でコピーするため、
+        データはAPIプロセスを経由しない。
+        最終以外のソースが最小パートサイズ未満の場合はパート単位で再アップロードする
+        """
+        if len(source_keys) == 1:
             try:
-                await client.put_object(
+                await self._call(
+                    'copy_object',
                     Bucket=self.bucket_name,
                     Key=key,
-                    Body=data,
+                    CopySource={'Bucket': self.bucket_name, 'Key': source_keys[0]},
                     ContentType='application/octet-stream'
                 )
                 return True
-            except ClientError as e:
-                logger.error(f"Failed to upload file: {e}")
+            except STORAGE_ERRORS as e:
+                logger.error(f"Failed to copy object: {e!r}")
                 return False
 
-    async def delete_object(self, key: str) -> bool:
-        """オブジェクトを削除"""
-        async with self.session.client(
-            's3',
-            endpoint_url=self.endpoint,
-            aws_access_key_id=self.access_key_id,
-            aws_secret_access_key=self.secret_access_key,
-            region_name='auto'
-        ) as client:
-            try:
-                await client.delete_object(
+        try:
+            response = await self._call(
+                'create_multipart_upload',
+                Bucket=self.bucket_name,
+                Key=key,
+                ContentType='application/octet-stream'
+            )
+        except STORAGE_ERRORS as e:
+            logger.error(f"Failed to create multipart upload: {e!r}")
+            return False
+        upload_id = response['UploadId']
+
+        try:
+            if all(size >= MIN_PART_SIZE for size in source_sizes[:-1]):
+                parts = await self._copy_parts(key, upload_id, source_keys)
+            else:
+                parts = await self._reupload_parts(key, upload_id, source_keys, source_sizes)
+
+            await self._call(
+                'complete_multipart_upload',
+                Bucket=self.bucket_name,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+            return True
+        except Exception as e:
+            # 途中で失敗したパートがストレージに残らないよう、原因を問わず中止する
+            logger.error(f"Failed to compose object {key}: {e!r}")
+            await self.abort_multipart_upload(key, upload_id)
+            return False
+
+    async def _copy_parts(self, key: str, upload_id: str, source_keys: list[str]) -> list[dict]:
+        """各ソースをUploadPartCopyで1パートとしてコピー（並列数を制限）"""
+        semaphore = asyncio.Semaphore(settings.R2_COMPOSE_CONCURRENCY)
+
+        async def copy_part(part_number: int, source_key: str) -> dict:
+            async with semaphore:
+                response = await self._call(
+                    'upload_part_copy',
                     Bucket=self.bucket_name,
-                    Key=key
+                    Key=key,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    CopySource={'Bucket': self.bucket_name, 'Key': source_key}
                 )
-                return True
-            except ClientError as e:
-                logger.error(f"Failed to delete object: {e}")
-                return False
-    
-    async def delete_chunk(self, key: str) -> bool:
-        """チャンクを削除"""
-        return await self.delete_object(key)
-    
+            return {'ETag': response['CopyPartResult']['ETag'], 'PartNumber': part_number}
+
+        return list(await asyncio.gather(*(
+            copy_part(part_number, source_key)
+            for part_number, source_key in enumerate(source_keys, start=1)
+        )))
+
+    async def _reupload_parts(
+        self,
+        key: str,
+        upload_id: str,
+        source_keys: list[str],
+        source_sizes: list[int]
+    ) -> list[dict]:
+        """
+        小さいソースを最小パートサイズ以上にまとめてアップロード
+
+        メモリ上に保持するのは1パート分のみ
+        """
+        parts = []
+        for part_number, (start, end) in enumerate(group_parts(source_sizes), start=1):
+            buffer = bytearray()
+            for source_key in source_keys[start:end]:
+                data = await self.download_chunk(source_key)
+                if data is None:
+                    raise ClientError(
+                        {'Error': {'Code': 'NoSuchKey', 'Message': f"Failed to read {source_key}"}},
+                        'GetObject'
+                    )
+                buffer.extend(data)
+            response = await self._call(
+                'upload_part',
+                Bucket=self.bucket_name,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=bytes(buffer)
+            )
+            parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+        return parts
+
+    async def create_multipart_upload(self, key: str) -> Optional[str]:
+        """マルチパートアップロードを開始してUploadIdを返す"""
+        try:
+            response = await self._call(
+                'create_multipart_upload',
+                Bucket=self.bucket_name,
+                Key=key,
+                ContentType='application/octet-stream'
+            )
+            return response['UploadId']
+        except STORAGE_ERRORS as e:
+            logger.error(f"Failed to create multipart upload: {e!r}")
+            return None
+
+    async def upload_part(
+        self,
+        key: str,
+        upload_id: str,
+        part_number: int,
+        data: bytes | BinaryIO
+    ) -> Optional[str]:
+        """パートをアップロードしてETagを返す"""
+        try:
+            response = await self._call(
+                'upload_part',
+                Bucket=self.bucket_name,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=data
+            )
+            return response['ETag']
+        except STORAGE_ERRORS as e:
+            logger.error(f"Failed to upload part: {e!r}")
+            return None
+
+    async def list_part_etags(self, key: str, upload_id: str) -> dict[int, str]:
+        """アップロード済みパートのETagを取得（パート番号 -> ETag）"""
+        etags = {}
+        marker = 0
+        try:
+            while True:
+                response = await self._call(
+                    'list_parts',
+                    Bucket=self.bucket_name,
+                    Key=key,
+                    UploadId=upload_id,
+                    PartNumberMarker=marker
+                )
+                for part in response.get('Parts', []):
+                    etags[part['PartNumber']] = part['ETag']
+                if not response.get('IsTruncated'):
+                    return etags
+                marker = response['NextPartNumberMarker']
+        except STORAGE_ERRORS as e:
+            logger.error(f"Failed to list parts: {e!r}")
+            return etags
+
+    async def complete_multipart_upload(self, key: str, upload_id: str, parts: list[dict]) -> bool:
+        """マルチパートアップロードを完了（partsはPartNumber昇順）"""
+        try:
+            await self._call(
+                'complete_multipart_upload',
+                Bucket=self.bucket_name,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+            return True
+        except STORAGE_ERRORS as e:
+            logger.error(f"Failed to complete multipart upload: {e!r}")
+            return False
+
+    async def abort_multipart_upload(self, key: str, upload_id: str) -> bool:
+        """マルチパートアップロードを中止"""
+        try:
+            await self._call(
+                'abort_multipart_upload',
+                Bucket=self.bucket_name,
+                Key=key,
+                UploadId=upload_id
+            )
+            return True
+        except STORAGE_ERRORS as e:
+            logger.error(f"Failed to abort multipart upload: {e!r}")
+            return False
+
     async def create_bucket_if_not_exists(self):
         """バケットが存在しない場合は作成"""
-        async with self.session.client(
-            's3',
-            endpoint_url=self.endpoint,
-            aws_access_key_id=self.access_key_id,
-            aws_secret_access_key=self.secret_access_key,
-            region_name='auto'
-        ) as client:
-            try:
-                await client.head_bucket(Bucket=self.bucket_name)
-                logger.info(f"Bucket {self.bucket_name} already exists")
-            except ClientError as e:
-                if e.response['Error']['Code'] == '404':
-                    logger.info(f"Creating bucket {self.bucket_name}")
-                    await client.create_bucket(Bucket=self.bucket_name)
-                else:
-                    raise
+        try:
+            await self._call('head_bucket', Bucket=self.bucket_name)
+            logger.info(f"Bucket {self.bucket_name} already exists")
+        except ClientError as e:
+            if e.response['Error']['Code'] == '404':
+                logger.info(f"Creating bucket {self.bucket_name}")
+                await self._call('create_bucket', Bucket=self.bucket_name)
+            else:
+                raise
 
 
 # シングルトンインスタンス
-storage = R2Storage()
\ No newline at end of file
+storage = R2Storage()
@@ -6,6 +6,13 @@ import logging
 from app.core.config import settings
 from app.api.v1.router import api_router
 from app.core.database import prisma
+from app.core.storage import storage
+from app.core.redis import redis_client, redis_binary_client, redis_pubsub_client
+from app.core.pubsub import event_hub
+from app.core.auth import auth_service
+from app.core.jwks import jwks_manager
+from app.services.id_filter import id_filter
+from app.services.share_cache import share_cache
 
 # ロギング設定
 logging.basicConfig(
@@ -21,11 +28,18 @@ async def lifespan(app: FastAPI):
     logger.info("Starting up SecurePass API...")
     await prisma.connect()
     logger.info("Database connected")
+    await storage.connect()
     
     yield
     
     # 終了時
     logger.info("Shutting down SecurePass API...")
+    await storage.disconnect()
+    await event_hub.close()
+    await jwks_manager.close()
+    await redis_client.aclose()
+    await redis_binary_client.aclose()
+    await redis_pubsub_client.aclose()
     await prisma.disconnect()
     logger.info("Database disconnected")
 
@@ -74,7 +88,14 @@ async def health_check():
         "services": {
             "database": db_status,
             "api": "healthy"
-        }
+        },
+        "caches": {
+            "share": share_cache.stats(),
+            "id_filter": id_filter.stats(),
+            "auth_token": auth_service.stats()
+        },
+        "jwks": jwks_manager.stats(),
+        "events": event_hub.stats()
     }
 
 @app.get("/")
@@ -10,6 +10,11 @@ class FileStatus(StrEnum):
     FAILED = "failed"
 
 
+class UploadMode(StrEnum):
+    CHUNKS = "chunks"  # チャンクを個別オブジェクトとして保存し、完了時に結合
+    MULTIPART = "multipart"  # チャンクをマルチパートアップロードのパートとして直接保存
+
+
 class FileBase(BaseModel):
     filename: str = Field(..., max_length=255)
     size: int = Field(..., gt=0)
@@ -39,6 +44,10 @@ class InitiateUploadRequest(BaseModel):
         le=100,
         description="最大ダウンロード回数"
     )
+    upload_mode: UploadMode = Field(
+        default=UploadMode.CHUNKS,
+        description="アップロード方式"
+    )
 
 
 class InitiateUploadResponse(BaseModel):
@@ -47,11 +56,20 @@ class InitiateUploadResponse(BaseModel):
     share_id: str = Field(..., description="共有ID（12文字）")
     session_key: str = Field(..., description="アップロードセッションキー")
     chunk_count: int = Field(..., description="総チャンク数")
-    chunk_urls: list[str] = Field(..., description="チャンクアップロード用の署名付きURL")
+    chunk_urls: list[str] = Field(..., description="先頭ウィンドウ分のチャンクアップロード用署名付きURL")
+    upload_mode: UploadMode = Field(default=UploadMode.CHUNKS, description="アップロード方式")
     
     model_config = ConfigDict(from_attributes=True)
 
 
+class ChunkUrlsResponse(BaseModel):
+    """チャンクアップロード用署名付きURL（ウィンドウ単位）レスポンス"""
+    start_index: int = Field(..., description="先頭のチャンクインデックス")
+    chunk_urls: list[str] = Field(..., description="start_indexから連続するチャンクの署名付きURL")
+    total_chunks: int = Field(..., description="総チャンク数")
+    expires_in: int = Field(..., description="URLの有効期間（秒）")
+
+
 class ChunkUploadRequest(BaseModel):
     """チャンクアップロードリクエスト"""
     session_key: str = Field(..., description="セッションキー")
@@ -59,6 +77,11 @@ class ChunkUploadRequest(BaseModel):
     chunk_data: str = Field(..., description="Base64エンコードされた暗号化チャンク")
 
 
+class PartUploadedRequest(BaseModel):
+    """署名付きURLでアップロードしたパートの報告リクエスト（multipartモード）"""
+    etag: str = Field(..., max_length=255, description="UploadPartレスポンスのETag")
+
+
 class ChunkUploadResponse(BaseModel):
     """チャンクアップロードレスポンス"""
     chunk_index: int = Field(..., description="アップロードされたチャンクインデックス")
@@ -118,14 +141,15 @@ class RecentFileItem(BaseModel):
 class RecentFilesResponse(BaseModel):
     """最近のファイル一覧レスポンス"""
     files: list[RecentFileItem]
-    total: int = Field(..., description="総ファイル数")
+    total: int | None = Field(None, description="総ファイル数（概算、include_total=falseの場合はnull）")
     limit: int = Field(..., description="取得制限数")
     offset: int = Field(..., description="取得開始位置")
+    next_cursor: str | None = Field(None, description="次ページのカーソル（最後のページの場合はnull）")
     
     @property
     def has_next(self) -> bool:
         """次のページがあるかどうか"""
-        return self.offset + self.limit < self.total
+        return self.next_cursor is not None
     
     @property
     def has_prev(self) -> bool:
@@ -49,6 +49,40 @@ class ApproveRequestResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class BulkRequestAction(str, Enum):
+    APPROVE = "approve"
+    REJECT = "reject"
+
+
+# 一括承認・拒否で一度に指定できるリクエスト数
+MAX_BULK_REQUEST_IDS = 100
+
+
+class BulkRequestActionRequest(BaseModel):
+    """リクエスト一括承認・拒否リクエスト"""
+    request_ids: List[str] = Field(
+        ...,
+        min_length=1,
+        max_length=MAX_BULK_REQUEST_IDS,
+        description="リクエストIDの一覧"
+    )
+    action: BulkRequestAction = Field(..., description="approve または reject")
+
+
+class BulkRequestResult(BaseModel):
+    """リクエストごとの処理結果"""
+    request_id: str
+    success: bool
+    status: Optional[RequestStatus] = None
+    error: Optional[str] = None
+
+
+class BulkRequestActionResponse(BaseModel):
+    """リクエスト一括承認・拒否レスポンス"""
+    results: List[BulkRequestResult]
+    updated: int
+
+
 class RejectRequestRequest(BaseModel):
     """リクエスト拒否リクエスト"""
     reason: Optional[str] = Field(None, max_length=200, description="拒否理由")
@@ -87,4 +121,5 @@ class RequestListResponse(BaseModel):
 
 class FileRequestListResponse(BaseModel):
     """ファイル詳細ページ用のリクエスト一覧レスポンス"""
-    requests: List[AccessRequestItem]
\ No newline at end of file
+    requests: List[AccessRequestItem]
+    next_cursor: Optional[str] = Field(None, description="次ページのカーソル（最後のページの場合はnull）")
\ No newline at end of file
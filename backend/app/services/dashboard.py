@@ -119,8 +119,7 @@ class DashboardService:
                 order=[{"createdAt": "desc"}],
                 take=limit,
                 include={
-                    "requests": True,
-                    "downloads": True
+                    "requests": True
                 }
             )
             
@@ -133,7 +132,7 @@ class DashboardService:
                     status=file.uploadStatus,
                     share_id=file.shareId,
                     request_count=len(file.requests) if file.requests else 0,
-                    download_count=len(set(download.requestId for download in file.downloads)) if file.downloads else 0
+                    download_count=file.uniqueDownloadCount
                 ))
             
             return activities
@@ -0,0 +1,183 @@
+from typing import Awaitable, Callable, Literal, Optional, TypeVar
+import asyncio
+import logging
+import time
+from redis.exceptions import RedisError
+from app.core.bloom import BloomFilter
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.redis import redis_binary_client
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+IdKind = Literal["share", "request"]
+ID_KINDS: tuple[IdKind, ...] = ("share", "request")
+
+# 構築済みのフィルターがある場合のみビットを立て、差分には常にビットを立てる
+# （未構築のフィルターに一部のIDだけが載り、既存IDを存在しないと誤判定するのを防ぐ）
+# KEYS[1]: フィルター, KEYS[2]: 差分 / ARGV: ビット位置
+_ADD_SCRIPT = """
+local built = redis.call('EXISTS', KEYS[1]) == 1
+for _, position in ipairs(ARGV) do
+    if built then
+        redis.call('SETBIT', KEYS[1], position, 1)
+    end
+    redis.call('SETBIT', KEYS[2], position, 1)
+end
+return 1
+"""
+
+# 再構築したフィルターに構築中の追加分を合成して差し替える
+# KEYS[1]: 再構築したフィルター, KEYS[2]: 差分, KEYS[3]: フィルター
+SWAP_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('BITOP', 'OR', KEYS[1], KEYS[1], KEYS[2])
+end
+redis.call('RENAME', KEYS[1], KEYS[3])
+return 1
+"""
+
+
+# ID_FILTER_CAPACITY・ID_FILTER_ERROR_RATE から決まるサイズ・ハッシュ数
+FILTER_SIZE, FILTER_HASH_COUNT = BloomFilter.optimal_parameters(
+    settings.ID_FILTER_CAPACITY,
+    settings.ID_FILTER_ERROR_RATE
+)
+
+
+def filter_keys(kind: IdKind) -> tuple[str, str, str]:
+    """
+    (フィルター, 差分, 再構築用)のRedisキー
+
+    キーにサイズ・ハッシュ数を含め、設定の異なるプロセス（設定変更のローリング中など）が
+    互いのビットマップを読み書きしないようにする。
+    対応するフィルターが見つからないプロセスは未構築として扱い、DBで確認する
+    """
+    base = f"id_filter:{kind}:{FILTER_SIZE}:{FILTER_HASH_COUNT}"
+    return base, f"{base}:delta", f"{base}:next"
+
+
+def new_filter(data: Optional[bytes] = None) -> BloomFilter:
+    return BloomFilter(FILTER_SIZE, FILTER_HASH_COUNT, data)
+
+
+class IdFilterService:
+    """
+    存在しない共有ID・リクエストIDを判定するサービス
+
+    - ワーカーがDB上の全IDからBloomフィルターを定期的に再構築し、Redisに保存する
+    - 各プロセスはRedisのフィルターを定期的に読み込んでメモリ上で判定する
+    - プロセス内のフィルターで存在しないと判定されたIDは、他プロセスで追加された直後の可能性があるため
+      Redis上のフィルターで確認する。それでも存在しなければネガティブキャッシュに記録する
+    - フィルターが未構築・Redisに到達できない場合は「存在し得る」としてDBで確認させる
+    - 偽陰性（存在するIDを存在しないと判定）を防ぐため、新しいIDをRedisのフィルターに追加できない場合は
+      呼び出し側でIDの作成を取り消す
+    """
+
+    def __init__(self):
+        self._filters: dict[str, Optional[BloomFilter]] = {kind: None for kind in ID_KINDS}
+        self._loaded_at: dict[str, float] = {kind: 0.0 for kind in ID_KINDS}
+        self._locks: dict[str, asyncio.Lock] = {kind: asyncio.Lock() for kind in ID_KINDS}
+        self._negative = TTLCache(
+            maxsize=settings.NEGATIVE_CACHE_SIZE,
+            ttl=settings.NEGATIVE_CACHE_TTL
+        )
+        self._add = redis_binary_client.register_script(_ADD_SCRIPT)
+        self.filter_rejections = 0
+
+    async def _get_filter(self, kind: IdKind) -> Optional[BloomFilter]:
+        """プロセス内のフィルターを取得（期限切れの場合はRedisから再読み込み）"""
+        if time.monotonic() - self._loaded_at[kind] < settings.ID_FILTER_REFRESH_SECONDS:
+            return self._filters[kind]
+
+        async with self._locks[kind]:
+            # 待機中に他のタスクが読み込んだ場合はそれを使う
+            if time.monotonic() - self._loaded_at[kind] < settings.ID_FILTER_REFRESH_SECONDS:
+                return self._filters[kind]
+            key, _, _ = filter_keys(kind)
+            try:
+                data = await redis_binary_client.get(key)
+            except RedisError as e:
+                logger.warning(f"Failed to load {kind} id filter: {e}")
+                data = None
+            try:
+                self._filters[kind] = new_filter(data) if data else None
+            except ValueError as e:
+                logger.warning(f"Ignoring {kind} id filter: {e}")
+                self._filters[kind] = None
+            self._loaded_at[kind] = time.monotonic()
+            return self._filters[kind]
+
+    async def might_exist(self, kind: IdKind, value: str) -> bool:
+        """IDが存在し得るか（Falseの場合は確実に存在しない）"""
+        if self._negative.get((kind, value)):
+            return False
+
+        bloom = await self._get_filter(kind)
+        if bloom is None or value in bloom:
+            return True
+
+        # 他プロセスで追加された直後のIDでないかRedis上のフィルターで確認
+        key, _, _ = filter_keys(kind)
+        try:
+            async with redis_binary_client.pipeline(transaction=False) as pipe:
+                for position in bloom.positions(value):
+                    pipe.getbit(key, position)
+                bits = await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Failed to check {kind} id filter: {e}")
+            return True
+        if all(bits):
+            bloom.add(value)
+            return True
+
+        self.filter_rejections += 1
+        self.record_missing(kind, value)
+        return False
+
+    def record_missing(self, kind: IdKind, value: str):
+        """DBに存在しなかったIDをネガティブキャッシュに記録"""
+        self._negative.set((kind, value), True)
+
+    async def lookup(self, kind: IdKind, value: str, fetch: Callable[[], Awaitable[Optional[T]]]) -> Optional[T]:
+        """存在し得るIDの場合のみfetchでDBを検索し、見つからなければネガティブキャッシュに記録"""
+        if not await self.might_exist(kind, value):
+            return None
+        result = await fetch()
+        if result is None:
+            self.record_missing(kind, value)
+        return result
+
+    async def add(self, kind: IdKind, value: str):
+        """
+        新しく作成したIDをフィルターに追加
+
+        Redisに追加できなかった場合は RedisError を送出する
+        （他プロセスが存在しないと誤判定するため、呼び出し側でIDの作成を取り消す）
+        """
+        self._negative.pop((kind, value))
+        bloom = self._filters[kind]
+        if bloom is not None:
+            bloom.add(value)
+        key, delta_key, _ = filter_keys(kind)
+        try:
+            await self._add(
+                keys=[key, delta_key],
+                args=BloomFilter.hash_positions(value, FILTER_SIZE, FILTER_HASH_COUNT)
+            )
+        except RedisError as e:
+            logger.error(f"Failed to add {kind} id to filter: {e}")
+            raise
+
+    def stats(self) -> dict:
+        negative = self._negative.stats()
+        return {
+            "filter_rejections": self.filter_rejections,
+            "negative_hits": negative["hits"],
+            "negative_size": negative["size"]
+        }
+
+
+id_filter = IdFilterService()
@@ -0,0 +1,179 @@
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Optional
+import json
+import logging
+from redis.exceptions import RedisError
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.database import prisma
+from app.core.redis import redis_client
+from app.services.id_filter import id_filter
+from app.schemas.file import FileStatus
+
+logger = logging.getLogger(__name__)
+
+# 読み込み開始時からバージョンが変わっていない場合のみ値を書き込む
+# KEYS[1]: 共有情報, KEYS[2]: バージョン / ARGV[1]: 読み込み開始時のバージョン（無い場合は空文字）, ARGV[2]: 値, ARGV[3]: TTL
+_FILL_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+@dataclass(frozen=True)
+class ShareSnapshot:
+    """共有ページで参照するファイル情報"""
+    file_id: str
+    share_id: str
+    filename: str
+    size: int
+    mime_type: str
+    upload_status: str
+    created_at: datetime
+    expires_at: datetime
+    max_downloads: int
+    user_id: Optional[str]
+    # 変更され得る値（変更時にキャッシュを無効化する）
+    unique_download_count: int
+    blocks_requests: bool
+    blocks_downloads: bool
+
+    @classmethod
+    def from_file(cls, file) -> "ShareSnapshot":
+        return cls(
+            file_id=file.id,
+            share_id=file.shareId,
+            filename=file.filename,
+            size=file.size,
+            mime_type=file.mimeType,
+            upload_status=file.uploadStatus,
+            created_at=file.createdAt,
+            expires_at=file.expiresAt,
+            max_downloads=file.maxDownloads,
+            user_id=file.userId,
+            unique_download_count=file.uniqueDownloadCount,
+            blocks_requests=file.blocksRequests,
+            blocks_downloads=file.blocksDownloads
+        )
+
+    def to_json(self) -> str:
+        data = asdict(self)
+        data["created_at"] = self.created_at.isoformat()
+        data["expires_at"] = self.expires_at.isoformat()
+        return json.dumps(data)
+
+    @classmethod
+    def from_json(cls, value: str) -> "ShareSnapshot":
+        data = json.loads(value)
+        data["created_at"] = datetime.fromisoformat(data["created_at"])
+        data["expires_at"] = datetime.fromisoformat(data["expires_at"])
+        return cls(**data)
+
+
+class ShareCacheService:
+    """
+    共有情報のリードスルーキャッシュ
+
+    プロセス内LRU（短いTTL）→ Redis → PostgreSQLの順に参照する。
+    ファイルの更新・ダウンロード数の変化・期限切れ処理の際は、DBの更新後に invalidate で
+    共有IDごとのバージョンを進めて値を削除する。DBから読み込んだ値は、読み込み前に取得したバージョンから
+    変わっていない場合のみ書き込むため、更新前に読んだ古い値が更新後に書き戻されることはない。
+    他プロセスのプロセス内キャッシュはTTL（SHARE_CACHE_LOCAL_TTL）の間だけ古い値を返し得る
+    """
+
+    def __init__(self):
+        self._local = TTLCache(
+            maxsize=settings.SHARE_CACHE_LOCAL_SIZE,
+            ttl=settings.SHARE_CACHE_LOCAL_TTL
+        )
+        self._fill = redis_client.register_script(_FILL_SCRIPT)
+        self.redis_hits = 0
+        self.redis_misses = 0
+
+    @staticmethod
+    def redis_keys(share_id: str) -> tuple[str, str]:
+        """(共有情報, バージョン)のRedisキー"""
+        # Redis Clusterでも同じスロットに載るようハッシュタグを付ける
+        base = f"share:{{{share_id}}}"
+        return base, f"{base}:version"
+
+    async def get(self, share_id: str) -> Optional[ShareSnapshot]:
+        """共有IDからファイル情報を取得（存在しない場合はNone）"""
+        snapshot = self._local.get(share_id)
+        if snapshot is not None:
+            return snapshot
+
+        # 存在しないIDはBloomフィルター・ネガティブキャッシュでRedis・DB検索前に除外
+        if not await id_filter.might_exist("share", share_id):
+            return None
+
+        key, version_key = self.redis_keys(share_id)
+        try:
+            value, version = await redis_client.mget(key, version_key)
+        except RedisError as e:
+            logger.warning(f"Failed to read share cache: {e}")
+            value, version = None, None
+        if value is not None:
+            self.redis_hits += 1
+            snapshot = ShareSnapshot.from_json(value)
+            self._local.set(share_id, snapshot)
+            return snapshot
+        self.redis_misses += 1
+
+        file = await prisma.file.find_unique(where={"shareId": share_id})
+        if not file:
+            id_filter.record_missing("share", share_id)
+            return None
+
+        snapshot = ShareSnapshot.from_file(file)
+        # アップロード中のファイルは状態がすぐに変わるためキャッシュしない
+        if snapshot.upload_status == FileStatus.COMPLETED.value:
+            try:
+                filled = await self._fill(
+                    keys=[key, version_key],
+                    args=[version or "", snapshot.to_json(), settings.SHARE_CACHE_TTL]
+                )
+            except RedisError as e:
+                logger.warning(f"Failed to write share cache: {e}")
+                filled = 1
+            # 読み込み中に更新された場合は古い可能性があるためプロセス内にも保持しない
+            if filled:
+                self._local.set(share_id, snapshot)
+        return snapshot
+
+    @staticmethod
+    def queue_invalidation(pipe, share_id: str):
+        """キャッシュ削除のコマンドをパイプラインに積む（ワーカーの同期クライアントからも使う）"""
+        key, version_key = ShareCacheService.redis_keys(share_id)
+        pipe.incr(version_key)
+        # 読み込み中のリクエストが書き込みを諦めるまでバージョンを保持する
+        pipe.expire(version_key, settings.SHARE_CACHE_TTL)
+        pipe.delete(key)
+
+    async def invalidate(self, share_id: str):
+        """共有情報をキャッシュから削除（DBの更新後に呼ぶ）"""
+        self._local.pop(share_id)
+        try:
+            async with redis_client.pipeline(transaction=True) as pipe:
+                self.queue_invalidation(pipe, share_id)
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Failed to invalidate share cache: {e}")
+
+    def stats(self) -> dict:
+        """キャッシュのヒット・ミス数"""
+        local = self._local.stats()
+        return {
+            "local_size": local["size"],
+            "local_hits": local["hits"],
+            "local_misses": local["misses"],
+            "redis_hits": self.redis_hits,
+            "redis_misses": self.redis_misses
+        }
+
+
+share_cache = ShareCacheService()
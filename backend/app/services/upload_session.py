@@ -0,0 +1,373 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional
+import json
+import logging
+from redis.exceptions import RedisError
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.database import prisma
+from app.core.redis import redis_client
+from app.core.security import security
+
+logger = logging.getLogger(__name__)
+
+# 進捗の管理先
+TRACKER_REDIS = "redis"
+TRACKER_DATABASE = "database"
+
+# チャンクを完了にし、(直前のビット, 完了チャンク数)を返す
+# セッションが存在しない場合は-1、アクティブでない場合は-2を直前のビットとして返す
+# KEYS[1]: セッションハッシュ, KEYS[2]: チャンクビットマップ, KEYS[3]: ETagハッシュ
+# ARGV[1]: チャンクインデックス, ARGV[2]: ETag（無い場合は空文字）
+_MARK_CHUNK_SCRIPT = """
+local status = redis.call('HGET', KEYS[1], 'status')
+if not status then
+    return {-1, 0}
+end
+if status ~= 'active' then
+    return {-2, 0}
+end
+local previous = redis.call('SETBIT', KEYS[2], ARGV[1], 1)
+if ARGV[2] ~= '' then
+    redis.call('HSET', KEYS[3], ARGV[1], ARGV[2])
+end
+local ttl = redis.call('PTTL', KEYS[1])
+if ttl > 0 then
+    redis.call('PEXPIRE', KEYS[2], ttl)
+    redis.call('PEXPIRE', KEYS[3], ttl)
+end
+return {previous, redis.call('BITCOUNT', KEYS[2])}
+"""
+
+
+class UploadSessionUnavailable(Exception):
+    """Redisで進捗管理しているセッションにRedisが応答しない"""
+
+
+@dataclass(frozen=True)
+class UploadSessionInfo:
+    """チャンクアップロードで参照するアップロードセッション情報（作成後は不変）"""
+    id: str
+    session_key: str
+    file_id: str
+    chunk_count: int
+    expires_at: datetime
+    metadata: dict = field(default_factory=dict)
+
+    @property
+    def upload_mode(self) -> Optional[str]:
+        return self.metadata.get("upload_mode")
+
+    @property
+    def upload_id(self) -> Optional[str]:
+        return self.metadata.get("upload_id")
+
+    @property
+    def tracker(self) -> str:
+        return self.metadata.get("tracker", TRACKER_DATABASE)
+
+    def chunk_size(self, chunk_index: int) -> Optional[int]:
+        """チャンクのサイズ（ファイルサイズを持たない古いセッションではNone）"""
+        size = self.metadata.get("size")
+        if size is None:
+            return None
+        chunk_size = self.metadata["chunk_size"]
+        return min(chunk_size, size - chunk_index * chunk_size)
+
+
+@dataclass(frozen=True)
+class ChunkTarget:
+    """アップロード対象のチャンク"""
+    index: int
+    r2_key: str
+    size: int
+    uploaded: bool
+
+
+class UploadSessionService:
+    """
+    アップロードセッション情報サービス
+
+    Redisで進捗管理するセッション（tracker=redis）は、セッション情報をハッシュ、
+    完了チャンクをビットマップで保持し、全チャンク完了時にPostgreSQLへ書き戻す。
+    セッション開始時にRedisへ登録できなかった場合は従来通りPostgreSQLで管理する
+    """
+
+    def __init__(self):
+        # セッションキー -> UploadSessionInfo
+        self._cache = TTLCache(
+            maxsize=settings.UPLOAD_SESSION_CACHE_SIZE,
+            ttl=settings.UPLOAD_SESSION_CACHE_TTL
+        )
+        self._mark_chunk = redis_client.register_script(_MARK_CHUNK_SCRIPT)
+
+    @staticmethod
+    def parse_metadata(metadata) -> dict:
+        """UploadSession.metadataを辞書として取得"""
+        if not metadata:
+            return {}
+        if isinstance(metadata, str):
+            return json.loads(metadata)
+        return metadata
+
+    @staticmethod
+    def _keys(session_key: str) -> tuple[str, str, str]:
+        # Redis Clusterでも同じスロットに載るようハッシュタグを付ける
+        base = f"upload_session:{{{session_key}}}"
+        return base, f"{base}:chunks", f"{base}:etags"
+
+    def _cache_info(self, info: UploadSessionInfo):
+        # セッションの有効期限を超えてキャッシュしない
+        remaining = (info.expires_at - datetime.now(timezone.utc)).total_seconds()
+        if remaining > 0:
+            self._cache.set(info.session_key, info, ttl=min(settings.UPLOAD_SESSION_CACHE_TTL, remaining))
+
+    async def register(self, info: UploadSessionInfo) -> bool:
+        """セッションをRedisに登録（有効期限でキーが自動削除される）"""
+        session_hash, _, _ = self._keys(info.session_key)
+        try:
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.hset(session_hash, mapping={
+                    "id": info.id,
+                    "file_id": info.file_id,
+                    "chunk_count": info.chunk_count,
+                    "expires_at": info.expires_at.isoformat(),
+                    "metadata": json.dumps(info.metadata),
+                    "status": "active"
+                })
+                pipe.expireat(session_hash, info.expires_at)
+                await pipe.execute()
+            return True
+        except RedisError as e:
+            logger.warning(f"Failed to register upload session in Redis: {e}")
+            return False
+
+    async def get_active(self, session_key: str) -> Optional[UploadSessionInfo]:
+        """
+        アクティブなアップロードセッションを取得（存在しない・アクティブでない場合はNone）
+
+        セッション情報は作成後に変わらないため、プロセス内にキャッシュする。
+        有効期限の判定は呼び出し側で行う
+        """
+        info = self._cache.get(session_key)
+        if info is not None:
+            return info
+
+        session_hash, _, _ = self._keys(session_key)
+        try:
+            data = await redis_client.hgetall(session_hash)
+        except RedisError as e:
+            logger.warning(f"Failed to read upload session from Redis: {e}")
+            data = None
+
+        if data:
+            if data.get("status") != "active":
+                return None
+            info = UploadSessionInfo(
+                id=data["id"],
+                session_key=session_key,
+                file_id=data["file_id"],
+                chunk_count=int(data["chunk_count"]),
+                expires_at=datetime.fromisoformat(data["expires_at"]),
+                metadata=json.loads(data["metadata"])
+            )
+            self._cache_info(info)
+            return info
+
+        session = await prisma.uploadsession.find_unique(
+            where={"sessionKey": session_key}
+        )
+        if not session or session.status != "active" or not session.fileId:
+            return None
+
+        metadata = self.parse_metadata(session.metadata)
+        info = UploadSessionInfo(
+            id=session.id,
+            session_key=session.sessionKey,
+            file_id=session.fileId,
+            chunk_count=metadata["total_chunks"],
+            expires_at=session.expiresAt,
+            metadata=metadata
+        )
+        if info.tracker == TRACKER_REDIS and data is not None:
+            # Redisに到達できたのにセッションが無い（期限切れで削除済み）
+            return None
+
+        self._cache_info(info)
+        return info
+
+    def invalidate(self, session_key: str):
+        """セッション情報をキャッシュから外す"""
+        self._cache.pop(session_key)
+
+    async def discard(self, session_key: str):
+        """セッションをキャッシュとRedisから削除"""
+        self.invalidate(session_key)
+        try:
+            await redis_client.delete(*self._keys(session_key))
+        except RedisError as e:
+            logger.warning(f"Failed to delete upload session from Redis: {e}")
+
+    async def update_status(self, info: UploadSessionInfo, status: str):
+        """セッションのステータスを更新し、キャッシュとRedisから外す"""
+        await self.discard(info.session_key)
+        await prisma.uploadsession.update(
+            where={"id": info.id},
+            data={"status": status}
+        )
+
+    async def get_chunk(self, info: UploadSessionInfo, chunk_index: int) -> Optional[ChunkTarget]:
+        """
+        アップロード対象のチャンクを取得
+
+        Redisで進捗管理しているセッションではDBを参照せず、ビットマップで完了済みか判定する
+        """
+        size = info.chunk_size(chunk_index)
+        if info.tracker == TRACKER_REDIS and size is not None:
+            _, chunk_bitmap, _ = self._keys(info.session_key)
+            try:
+                uploaded = await redis_client.getbit(chunk_bitmap, chunk_index)
+            except RedisError as e:
+                raise UploadSessionUnavailable(str(e)) from e
+            r2_key = (
+                security.generate_r2_key(info.file_id)
+                if info.upload_id
+                else security.generate_r2_key(info.file_id, chunk_index)
+            )
+            return ChunkTarget(index=chunk_index, r2_key=r2_key, size=size, uploaded=bool(uploaded))
+
+        chunk = await prisma.filechunk.find_unique(
+            where={
+                "fileId_chunkIndex": {
+                    "fileId": info.file_id,
+                    "chunkIndex": chunk_index
+                }
+            }
+        )
+        if not chunk:
+            return None
+        return ChunkTarget(
+            index=chunk.chunkIndex,
+            r2_key=chunk.r2Key,
+            size=chunk.size,
+            uploaded=chunk.uploadedAt is not None
+        )
+
+    async def get_progress(self, info: UploadSessionInfo) -> Optional[int]:
+        """完了チャンク数を取得（ファイルが存在しない場合はNone）"""
+        if info.tracker == TRACKER_REDIS:
+            _, chunk_bitmap, _ = self._keys(info.session_key)
+            try:
+                return await redis_client.bitcount(chunk_bitmap)
+            except RedisError as e:
+                raise UploadSessionUnavailable(str(e)) from e
+
+        file = await prisma.file.find_unique(where={"id": info.file_id})
+        return file.uploadedChunks if file else None
+
+    async def mark_chunk_uploaded(
+        self,
+        info: UploadSessionInfo,
+        chunk_index: int,
+        etag: Optional[str]
+    ) -> Optional[tuple[bool, int]]:
+        """
+        チャンクを完了にし、(今回完了にしたか, 完了チャンク数)を返す
+
+        並行アップロードで先を越された場合は今回完了にしたかがFalseになる。
+        セッションがアクティブでない場合はNoneを返す
+        """
+        if info.tracker == TRACKER_REDIS:
+            try:
+                previous, uploaded_chunks = await self._mark_chunk(
+                    keys=list(self._keys(info.session_key)),
+                    args=[chunk_index, etag or ""]
+                )
+            except RedisError as e:
+                raise UploadSessionUnavailable(str(e)) from e
+            if previous < 0:
+                return None
+            return previous == 0, uploaded_chunks
+
+        # チャンクの完了マークと進捗の加算を1文でアトミックに実行
+        progress = await self._mark_chunk_in_database(info.file_id, chunk_index, etag)
+        if progress is None:
+            uploaded_chunks = await self.get_progress(info)
+            return (False, uploaded_chunks) if uploaded_chunks is not None else None
+        return True, progress["uploadedChunks"]
+
+    async def _mark_chunk_in_database(self, file_id: str, chunk_index: int, etag: Optional[str]) -> Optional[dict]:
+        """
+        未アップロードのチャンクを完了にし、ファイルの進捗をSQL上で加算
+
+        チャンクが既に完了済みだった場合はNoneを返す
+        """
+        rows = await prisma.query_raw(
+            """
+            WITH marked AS (
+                UPDATE "FileChunk"
+                SET "uploadedAt" = NOW() AT TIME ZONE 'UTC', "etag" = $3
+                WHERE "fileId" = $1 AND "chunkIndex" = $2 AND "uploadedAt" IS NULL
+                RETURNING "fileId"
+            )
+            UPDATE "File"
+            SET "uploadedChunks" = "uploadedChunks" + 1,
+                "uploadStatus" = CASE
+                    WHEN "uploadedChunks" + 1 >= "chunkCount" THEN 'completed'
+                    ELSE "uploadStatus"
+                END
+            WHERE "id" IN (SELECT "fileId" FROM marked)
+            RETURNING "uploadedChunks", "chunkCount"
+            """,
+            file_id,
+            chunk_index,
+            etag
+        )
+        return rows[0] if rows else None
+
+    async def complete(self, info: UploadSessionInfo):
+        """
+        全チャンク完了時にセッションを終了
+
+        Redisで進捗管理しているセッションは、チャンクの完了状態・ETag・進捗を
+        PostgreSQLへ書き戻してからRedisのキーを削除する（書き戻しは冪等）
+        """
+        if info.tracker != TRACKER_REDIS:
+            await self.update_status(info, "completed")
+            return
+
+        _, _, etag_hash = self._keys(info.session_key)
+        try:
+            etags = await redis_client.hgetall(etag_hash)
+        except RedisError as e:
+            raise UploadSessionUnavailable(str(e)) from e
+
+        now = datetime.now(timezone.utc)
+        async with prisma.batch_() as batcher:
+            batcher.filechunk.update_many(
+                where={"fileId": info.file_id, "uploadedAt": None},
+                data={"uploadedAt": now}
+            )
+            for chunk_index, etag in etags.items():
+                batcher.filechunk.update(
+                    where={
+                        "fileId_chunkIndex": {
+                            "fileId": info.file_id,
+                            "chunkIndex": int(chunk_index)
+                        }
+                    },
+                    data={"etag": etag}
+                )
+            batcher.file.update(
+                where={"id": info.file_id},
+                data={"uploadedChunks": info.chunk_count, "uploadStatus": "completed"}
+            )
+            batcher.uploadsession.update(
+                where={"id": info.id},
+                data={"status": "completed"}
+            )
+        await self.discard(info.session_key)
+
+
+upload_session_service = UploadSessionService()
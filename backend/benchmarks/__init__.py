@@ -0,0 +1,22 @@
+"""
+パフォーマンス計測用スクリプト
+
+app.core.config は必須の環境変数を読み込むため、
+未設定の場合はベンチマーク用のダミー値を補完する（実サービスには接続しない）
+"""
+
+import os
+
+for _key, _value in {
+    "SECRET_KEY": "bench",
+    "DATABASE_URL": "postgresql://bench@localhost/bench",
+    "REDIS_URL": "redis://localhost:6379/0",
+    "R2_ENDPOINT": "https://bench.r2.cloudflarestorage.com",
+    "R2_ACCESS_KEY_ID": "bench-access-key",
+    "R2_SECRET_ACCESS_KEY": "bench-secret-key",
+    "R2_BUCKET_NAME": "bench-bucket",
+    "IP_HASH_SALT": "bench",
+    "AUTH0_DOMAIN": "bench.auth0.com",
+    "AUTH0_AUDIENCE": "bench",
+}.items():
+    os.environ.setdefault(_key, _value)
@@ -0,0 +1,75 @@
+"""
+チャンクアップロード受信処理のメモリ・スループット比較
+
+- json_base64: 旧ルート。Base64文字列を含むJSONをPydanticで検証してデコード
+- octet_stream: upload_chunk_binary と同じく、受信したボディを
+                SpooledTemporaryFile へ逐次書き込み
+
+R2への送信部分は共通のため含めない。ボディは64KB単位で届くものとして扱う
+
+実行: uv run python -m benchmarks.bench_chunk_upload
+"""
+
+import base64
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from app.core.config import settings
+from app.schemas.file import ChunkUploadRequest
+
+CHUNK_SIZE = settings.CHUNK_SIZE
+RECEIVE_SIZE = 64 * 1024
+ROUNDS = 20
+
+
+def json_base64(body: bytes) -> int:
+    request = ChunkUploadRequest.model_validate_json(body)
+    return len(base64.b64decode(request.chunk_data))
+
+
+def octet_stream(body: bytes) -> int:
+    with tempfile.SpooledTemporaryFile(max_size=settings.CHUNK_SPOOL_MAX_MEMORY) as spool:
+        for offset in range(0, len(body), RECEIVE_SIZE):
+            spool.write(body[offset:offset + RECEIVE_SIZE])
+        spool.seek(0, os.SEEK_END)
+        return spool.tell()
+
+
+def measure(name: str, func, body: bytes):
+    # ピークメモリ（受信済みボディ自体は除く）
+    tracemalloc.start()
+    func(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        func(body)
+    elapsed = time.perf_counter() - start
+    throughput = CHUNK_SIZE * ROUNDS / elapsed / (1024 * 1024)
+
+    print(
+        f"{name:>13} wire={len(body) / (1024 * 1024):6.2f} MiB "
+        f"peak={peak / (1024 * 1024):6.2f} MiB "
+        f"throughput={throughput:8.1f} MiB/s"
+    )
+
+
+def main():
+    chunk = os.urandom(CHUNK_SIZE)
+    json_body = json.dumps({
+        "session_key": "bench",
+        "chunk_index": 0,
+        "chunk_data": base64.b64encode(chunk).decode()
+    }).encode()
+
+    print(f"chunk size: {CHUNK_SIZE / (1024 * 1024):.2f} MiB")
+    measure("json_base64", json_base64, json_body)
+    measure("octet_stream", octet_stream, chunk)
+
+
+if __name__ == "__main__":
+    main()
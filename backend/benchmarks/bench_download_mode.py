@@ -0,0 +1,80 @@
+"""
+download_fileのダウンロードモード別 API CPU時間ベンチマーク
+
+1GBを配信する際にAPIプロセスが消費するCPU時間を比較する
+- stream:   stream_file_from_r2 と同様に、R2のボディ（64KB単位）を
+            StreamingResponse で中継
+- redirect: 署名付きGET URLを生成して302を返す（バイト列はAPIを経由しない）
+
+R2との通信・ソケット書き込みは含めない（stream側の実コストはさらに大きくなる）
+
+実行: uv run python -m benchmarks.bench_download_mode
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+from fastapi.responses import StreamingResponse
+
+from app.api.v1.endpoints.download import _redirect_response
+
+GB = 1024 * 1024 * 1024
+FILE_SIZE = 100 * 1024 * 1024  # 1ファイルあたりのサイズ
+RECEIVE_SIZE = 64 * 1024
+SCOPE = {"type": "http", "asgi": {"spec_version": "2.4"}, "method": "GET", "headers": []}
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+async def r2_body(buffer: bytes):
+    """R2のレスポンスボディ相当（64KB単位でyield）"""
+    view = memoryview(buffer)
+    for offset in range(0, FILE_SIZE, RECEIVE_SIZE):
+        yield bytes(view[offset:offset + RECEIVE_SIZE])
+
+
+async def stream_mode(buffer: bytes):
+    response = StreamingResponse(r2_body(buffer), media_type="application/octet-stream")
+    await response(SCOPE, receive, send)
+
+
+async def redirect_mode(file):
+    response = _redirect_response(file)
+    await response(SCOPE, receive, send)
+
+
+async def measure(name: str, func, *args) -> float:
+    downloads = GB // FILE_SIZE
+    start = time.process_time()
+    for _ in range(downloads):
+        await func(*args)
+    cpu = time.process_time() - start
+    print(f"{name:>9} downloads={downloads:>3} cpu_per_gb={cpu * 1000:10.2f} ms")
+    return cpu
+
+
+async def main():
+    file = SimpleNamespace(
+        id="bench-file",
+        r2Key="files/bench-file/file",
+        filename="bench.bin",
+        mimeType="application/octet-stream",
+        size=FILE_SIZE
+    )
+    _redirect_response(file)  # 署名クライアントの初回生成を計測から除外
+
+    print(f"file size: {FILE_SIZE / (1024 * 1024):.0f} MiB, total: 1 GiB")
+    stream_cpu = await measure("stream", stream_mode, bytes(FILE_SIZE))
+    redirect_cpu = await measure("redirect", redirect_mode, file)
+    print(f"redirect uses {stream_cpu / redirect_cpu:.0f}x less API CPU per GB")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,59 @@
+"""
+initiate_uploadの署名付きURL生成ベンチマーク
+
+チャンク数ごとに以下を比較する（ネットワーク通信は発生しない）
+- per_call_client: 旧実装。URLごとにaioboto3クライアントを生成して署名
+- presign_many:    R2Storage.presign_many による一括署名
+
+実行: uv run python -m benchmarks.bench_presign
+"""
+
+import asyncio
+import time
+
+from app.core.security import security
+from app.core.storage import R2Storage
+
+CHUNK_COUNTS = [1, 10, 100, 500, 1000]
+
+
+async def per_call_client(r2: R2Storage, keys: list[str]) -> list[str]:
+    """旧実装: URLごとにクライアントを生成"""
+    urls = []
+    for key in keys:
+        async with r2.session.client(
+            's3',
+            endpoint_url=r2.endpoint,
+            aws_access_key_id=r2.access_key_id,
+            aws_secret_access_key=r2.secret_access_key,
+            region_name='auto'
+        ) as client:
+            urls.append(await client.generate_presigned_url(
+                ClientMethod='put_object',
+                Params={'Bucket': r2.bucket_name, 'Key': key},
+                ExpiresIn=3600
+            ))
+    return urls
+
+
+async def main():
+    r2 = R2Storage()
+    r2.presign_many(["warmup"])  # 署名クライアントの初回生成を計測から除外
+
+    print(f"{'chunks':>8} {'per_call_client (ms)':>22} {'presign_many (ms)':>20} {'speedup':>9}")
+    for count in CHUNK_COUNTS:
+        keys = [security.generate_r2_key("bench-file", i) for i in range(count)]
+
+        start = time.perf_counter()
+        await per_call_client(r2, keys)
+        baseline = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        r2.presign_many(keys)
+        batched = (time.perf_counter() - start) * 1000
+
+        print(f"{count:>8} {baseline:>22.1f} {batched:>20.1f} {baseline / batched:>8.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
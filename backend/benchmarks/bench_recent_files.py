@@ -0,0 +1,105 @@
+"""
+get_recent_files のクエリ比較ベンチマーク（要PostgreSQL）
+
+リクエストが大量に付いたファイルを持つユーザーを作成し、1ページ分の取得時間を比較する
+- include:   旧実装。find_many(include={"requests": True}) で全リクエストを取得し、Pythonで集計
+- aggregate: _fetch_recent_files。ファイルごとのリクエスト数をSQL上で集計して1クエリで取得
+
+DATABASE_URL のデータベースに計測用のユーザー・ファイル・リクエストを作成し、終了時に削除する
+
+実行: uv run python -m benchmarks.bench_recent_files
+"""
+
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app.api.v1.endpoints.files import _fetch_recent_files
+from app.core.database import prisma
+
+FILES = 50
+REQUESTS_PER_FILE = 2000
+PAGE_SIZE = 20
+ROUNDS = 20
+
+
+async def seed(user_id: str):
+    await prisma.user.create({"id": user_id, "email": f"{user_id}@bench.invalid"})
+    now = datetime.now(timezone.utc)
+    file_ids = [str(uuid.uuid4()) for _ in range(FILES)]
+    await prisma.file.create_many(data=[
+        {
+            "id": file_id,
+            "shareId": uuid.uuid4().hex[:12],
+            "filename": f"bench-{i}.bin",
+            "size": 1024,
+            "mimeType": "application/octet-stream",
+            "encryptedKey": "bench",
+            "r2Key": "",
+            "uploadStatus": "completed",
+            "createdAt": now - timedelta(seconds=i),
+            "expiresAt": now + timedelta(days=1),
+            "userId": user_id
+        }
+        for i, file_id in enumerate(file_ids)
+    ])
+    for file_id in file_ids:
+        await prisma.accessrequest.create_many(data=[
+            {
+                "requestId": uuid.uuid4().hex[:12],
+                "fileId": file_id,
+                "status": "pending" if i % 3 == 0 else "approved",
+                "ipHash": "0" * 64
+            }
+            for i in range(REQUESTS_PER_FILE)
+        ])
+
+
+async def include_requests(user_id: str) -> list:
+    files = await prisma.file.find_many(
+        where={"userId": user_id},
+        take=PAGE_SIZE,
+        order=[{"createdAt": "desc"}, {"id": "desc"}],
+        include={"requests": True}
+    )
+    return [
+        (len(file.requests), len([r for r in file.requests if r.status == "pending"]))
+        for file in files
+    ]
+
+
+async def aggregate(user_id: str) -> list:
+    files, _ = await _fetch_recent_files(user_id, PAGE_SIZE)
+    return [(file.request_count, file.pending_request_count) for file in files]
+
+
+async def measure(name: str, func, user_id: str) -> list:
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        result = await func(user_id)
+        timings.append((time.perf_counter() - start) * 1000)
+    print(f"{name:>9} p50={statistics.median(timings):9.2f} ms max={max(timings):9.2f} ms")
+    return result
+
+
+async def main():
+    await prisma.connect()
+    user_id = f"bench-{uuid.uuid4()}"
+    try:
+        print(f"seeding {FILES} files x {REQUESTS_PER_FILE} requests...")
+        await seed(user_id)
+        print(f"page size: {PAGE_SIZE}, rounds: {ROUNDS}")
+        expected = await measure("include", include_requests, user_id)
+        actual = await measure("aggregate", aggregate, user_id)
+        assert expected == actual, "counts differ"
+    finally:
+        await prisma.file.delete_many(where={"userId": user_id})  # リクエストはカスケード削除
+        await prisma.user.delete_many(where={"id": user_id})
+        await prisma.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
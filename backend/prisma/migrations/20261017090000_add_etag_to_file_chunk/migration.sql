@@ -0,0 +1,2 @@
+-- AlterTable
+ALTER TABLE "FileChunk" ADD COLUMN "etag" VARCHAR(255);
@@ -0,0 +1,25 @@
+-- AlterTable
+ALTER TABLE "File" ADD COLUMN "uniqueDownloadCount" INTEGER NOT NULL DEFAULT 0;
+
+-- AlterTable
+ALTER TABLE "AccessRequest" ADD COLUMN "firstDownloadedAt" TIMESTAMP(3);
+
+-- Backfill: 初回ダウンロード日時
+UPDATE "AccessRequest" AS r
+SET "firstDownloadedAt" = d."firstDownloadedAt"
+FROM (
+    SELECT "requestId", MIN("downloadedAt") AS "firstDownloadedAt"
+    FROM "DownloadLog"
+    GROUP BY "requestId"
+) AS d
+WHERE r."id" = d."requestId";
+
+-- Backfill: ダウンロードしたユニークなリクエスト数
+UPDATE "File" AS f
+SET "uniqueDownloadCount" = d."count"
+FROM (
+    SELECT "fileId", COUNT(DISTINCT "requestId")::INTEGER AS "count"
+    FROM "DownloadLog"
+    GROUP BY "fileId"
+) AS d
+WHERE f."id" = d."fileId";
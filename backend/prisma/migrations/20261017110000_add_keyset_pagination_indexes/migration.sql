@@ -0,0 +1,5 @@
+-- CreateIndex
+CREATE INDEX "File_userId_createdAt_id_idx" ON "File"("userId", "createdAt", "id");
+
+-- CreateIndex
+CREATE INDEX "AccessRequest_fileId_createdAt_id_idx" ON "AccessRequest"("fileId", "createdAt", "id");
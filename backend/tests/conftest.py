@@ -0,0 +1,22 @@
+"""
+テスト共通設定
+
+app.core.config は必須の環境変数を読み込むため、
+未設定の場合はテスト用のダミー値を補完する（設定済みの値はそのまま使う）
+"""
+
+import os
+
+for _key, _value in {
+    "SECRET_KEY": "test",
+    "DATABASE_URL": "postgresql://test@localhost/test",
+    "REDIS_URL": "redis://localhost:6379/0",
+    "R2_ENDPOINT": "https://test.r2.cloudflarestorage.com",
+    "R2_ACCESS_KEY_ID": "test-access-key",
+    "R2_SECRET_ACCESS_KEY": "test-secret-key",
+    "R2_BUCKET_NAME": "test-bucket",
+    "IP_HASH_SALT": "test",
+    "AUTH0_DOMAIN": "test.auth0.com",
+    "AUTH0_AUDIENCE": "test",
+}.items():
+    os.environ.setdefault(_key, _value)
@@ -0,0 +1,126 @@
+"""
+JWKSManager のテスト（ローカルのスタブJWKSサーバーを使用）
+"""
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from app.core.config import settings
+from app.core.jwks import JWKSManager
+
+CONCURRENCY = 200
+
+
+def make_jwk(kid: str) -> dict:
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(key.public_key()))
+    jwk.update({"kid": kid, "use": "sig"})
+    return jwk
+
+
+class StubJWKSServer:
+    """JWKSを返すHTTPサーバー（返す鍵・ステータスを差し替え、リクエスト数を数える）"""
+
+    def __init__(self):
+        self.jwks = {"keys": [make_jwk("key-1")]}
+        self.status = 200
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests += 1
+                time.sleep(0.05)  # 同時リクエストが取得中に重なるよう応答を遅らせる
+                body = json.dumps(stub.jwks).encode()
+                self.send_response(stub.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_port}/.well-known/jwks.json"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def jwks_server():
+    server = StubJWKSServer()
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+async def manager(jwks_server):
+    manager = JWKSManager(jwks_server.url)
+    yield manager
+    await manager.close()
+
+
+async def test_concurrent_cold_start_fetches_once(manager, jwks_server):
+    keys = await asyncio.gather(*(manager.get_key("key-1") for _ in range(CONCURRENCY)))
+
+    assert all(key is not None for key in keys)
+    assert jwks_server.requests == 1
+    assert manager.fetches == 1
+
+
+async def test_unknown_kid_within_min_refresh_does_not_refetch(manager, jwks_server, monkeypatch):
+    monkeypatch.setattr(settings, "JWKS_MIN_REFRESH_SECONDS", 3600)
+    assert await manager.get_key("key-1") is not None
+
+    keys = await asyncio.gather(*(manager.get_key(f"unknown-{i}") for i in range(CONCURRENCY)))
+
+    assert all(key is None for key in keys)
+    assert jwks_server.requests == 1
+
+
+async def test_rotated_kid_is_found_after_one_refetch(manager, jwks_server, monkeypatch):
+    monkeypatch.setattr(settings, "JWKS_MIN_REFRESH_SECONDS", 0)
+    assert await manager.get_key("key-1") is not None
+
+    jwks_server.jwks = {"keys": [make_jwk("key-2")]}
+
+    assert await manager.get_key("key-2") is not None
+    assert jwks_server.requests == 2
+
+
+async def test_failed_fetch_keeps_previous_keys(manager, jwks_server, monkeypatch):
+    monkeypatch.setattr(settings, "JWKS_MIN_REFRESH_SECONDS", 0)
+    monkeypatch.setattr(settings, "JWKS_CACHE_TTL", 0)
+    key = await manager.get_key("key-1")
+    assert key is not None
+
+    jwks_server.status = 500
+
+    assert await manager.get_key("key-1") is key
+    assert jwks_server.requests == 2
+
+
+async def test_stale_keys_are_refetched(manager, jwks_server, monkeypatch):
+    monkeypatch.setattr(settings, "JWKS_MIN_REFRESH_SECONDS", 0)
+    assert await manager.get_key("key-1") is not None
+    assert await manager.get_key("key-1") is not None
+    assert jwks_server.requests == 1
+
+    monkeypatch.setattr(settings, "JWKS_CACHE_TTL", 0)
+
+    assert await manager.get_key("key-1") is not None
+    assert jwks_server.requests == 2
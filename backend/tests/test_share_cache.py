@@ -0,0 +1,138 @@
+"""
+共有情報キャッシュ（ShareCacheService）のテスト
+
+Redisはfakeredis、DBの検索はテスト用の関数に差し替える。
+Prismaクライアントが未生成の場合はモジュールごとスキップする
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+try:
+    from app.services import share_cache as share_cache_module
+except Exception as e:  # Prismaクライアントが未インストール・未生成
+    pytest.skip(f"Prisma client is not available: {e}", allow_module_level=True)
+
+from app.schemas.file import FileStatus
+from app.services.share_cache import ShareCacheService
+
+SHARE_ID = "abcdefghijkl"
+
+
+def make_file(**changes) -> SimpleNamespace:
+    now = datetime.now(timezone.utc)
+    values = {
+        "id": "file-1",
+        "shareId": SHARE_ID,
+        "filename": "test.bin",
+        "size": 1024,
+        "mimeType": "application/octet-stream",
+        "uploadStatus": FileStatus.COMPLETED.value,
+        "createdAt": now,
+        "expiresAt": now + timedelta(days=1),
+        "maxDownloads": 1,
+        "userId": None,
+        "uniqueDownloadCount": 0,
+        "blocksRequests": False,
+        "blocksDownloads": False
+    }
+    values.update(changes)
+    return SimpleNamespace(**values)
+
+
+class FakeFiles:
+    """prisma.file の代わり（find_unique の前に任意の処理を挟める）"""
+
+    def __init__(self, file):
+        self.file = file
+        self.before_return = None
+        self.calls = 0
+
+    async def find_unique(self, where):
+        self.calls += 1
+        file = self.file
+        if self.before_return is not None:
+            await self.before_return()
+        return file
+
+
+@pytest.fixture
+async def fake_redis(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(share_cache_module, "redis_client", client)
+    yield client
+    await client.aclose()
+
+
+@pytest.fixture
+def files(monkeypatch) -> FakeFiles:
+    files = FakeFiles(make_file())
+    monkeypatch.setattr(share_cache_module, "prisma", SimpleNamespace(file=files))
+
+    async def might_exist(kind, value):
+        return True
+
+    monkeypatch.setattr(share_cache_module.id_filter, "might_exist", might_exist)
+    return files
+
+
+@pytest.fixture
+def cache(fake_redis, files) -> ShareCacheService:
+    return ShareCacheService()  # スクリプトをfakeredisに登録する
+
+
+async def test_fill_is_served_from_redis(cache, files):
+    await cache.get(SHARE_ID)
+    cache._local.pop(SHARE_ID)
+
+    snapshot = await cache.get(SHARE_ID)
+
+    assert snapshot.file_id == "file-1"
+    assert files.calls == 1
+    assert cache.redis_hits == 1
+
+
+async def test_update_during_read_does_not_cache_stale_snapshot(cache, files, fake_redis):
+    # 読み込み中（DBから古い値を読んだ後）にファイルが更新され、キャッシュが削除される
+    async def update():
+        files.file = make_file(blocksDownloads=True, uniqueDownloadCount=1)
+        await cache.invalidate(SHARE_ID)
+
+    files.before_return = update
+    stale = await cache.get(SHARE_ID)
+    assert stale.blocks_downloads is False
+
+    key, _ = ShareCacheService.redis_keys(SHARE_ID)
+    assert await fake_redis.get(key) is None
+
+    # 次の読み込みでは更新後の値を返す
+    files.before_return = None
+    fresh = await cache.get(SHARE_ID)
+    assert fresh.blocks_downloads is True
+    assert fresh.unique_download_count == 1
+
+
+async def test_concurrent_updates_leave_no_stale_snapshot(cache, files):
+    await cache.get(SHARE_ID)
+
+    # ダウンロード数の加算とフラグの変更が並行して完了する
+    files.file = make_file(blocksDownloads=True, uniqueDownloadCount=1)
+    await asyncio.gather(cache.invalidate(SHARE_ID), cache.invalidate(SHARE_ID))
+
+    snapshot = await cache.get(SHARE_ID)
+    assert snapshot.blocks_downloads is True
+    assert snapshot.unique_download_count == 1
+
+
+async def test_uploading_file_is_not_cached(cache, files, fake_redis):
+    files.file = make_file(uploadStatus=FileStatus.UPLOADING.value)
+
+    await cache.get(SHARE_ID)
+
+    key, _ = ShareCacheService.redis_keys(SHARE_ID)
+    assert await fake_redis.get(key) is None
+    assert cache._local.get(SHARE_ID) is None
@@ -0,0 +1,35 @@
+"""
+R2Storage の再アップロード時のパート分割（group_parts）のテスト
+"""
+
+from app.core.storage import MIN_PART_SIZE, group_parts
+
+MB = 1024 * 1024
+
+
+def part_sizes(sizes: list[int]) -> list[int]:
+    return [sum(sizes[start:end]) for start, end in group_parts(sizes)]
+
+
+def test_groups_cover_all_sources_in_order():
+    sizes = [MB] * 12
+    groups = group_parts(sizes)
+
+    assert [index for start, end in groups for index in range(start, end)] == list(range(len(sizes)))
+
+
+def test_uneven_sources_meet_min_part_size():
+    # 先頭が大きく後続が小さい場合も、先頭のサイズからまとめる数を決めると最小サイズを下回る
+    sizes = [4 * MB, 1 * MB, 1 * MB, 512 * 1024, 3 * MB, 2 * MB, 100, 6 * MB, 1 * MB]
+
+    assert all(size >= MIN_PART_SIZE for size in part_sizes(sizes)[:-1])
+
+
+def test_large_sources_are_one_part_each():
+    sizes = [MIN_PART_SIZE, MIN_PART_SIZE + 1, MB]
+
+    assert group_parts(sizes) == [(0, 1), (1, 2), (2, 3)]
+
+
+def test_small_sources_form_single_part():
+    assert group_parts([MB, MB]) == [(0, 2)]
@@ -0,0 +1,202 @@
+"""
+チャンク完了マーク（mark_chunk_uploaded）の並行実行テスト
+
+- Redisで進捗管理するセッション: fakeredis上でスクリプトを実行する（PostgreSQL不要）
+- PostgreSQLで進捗管理するセッション: DATABASE_URL のデータベースにファイル・チャンク・セッションを作成し、
+  終了時に削除する。データベースに接続できない場合はスキップする
+
+Prismaクライアントが未生成の場合はモジュールごとスキップする
+"""
+
+import asyncio
+import json
+import uuid
+from datetime import timedelta
+
+import pytest
+
+try:
+    from app.core.database import prisma
+except Exception as e:  # Prismaクライアントが未インストール・未生成
+    pytest.skip(f"Prisma client is not available: {e}", allow_module_level=True)
+
+from app.core.security import security
+from app.schemas.file import FileStatus
+from app.services import upload_session as upload_session_module
+from app.services.upload_session import (
+    TRACKER_DATABASE,
+    TRACKER_REDIS,
+    UploadSessionInfo,
+    UploadSessionService,
+    upload_session_service,
+)
+
+CHUNK_COUNT = 32
+CHUNK_SIZE = 1024
+
+
+def make_session_info(tracker: str) -> UploadSessionInfo:
+    return UploadSessionInfo(
+        id=str(uuid.uuid4()),
+        session_key=security.generate_session_key(),
+        file_id=str(uuid.uuid4()),
+        chunk_count=CHUNK_COUNT,
+        expires_at=security.calculate_expiry(1),
+        metadata={
+            "total_chunks": CHUNK_COUNT,
+            "chunk_size": CHUNK_SIZE,
+            "size": CHUNK_COUNT * CHUNK_SIZE,
+            "tracker": tracker
+        }
+    )
+
+
+@pytest.fixture
+async def fake_redis(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(upload_session_module, "redis_client", client)
+    yield client
+    await client.aclose()
+
+
+@pytest.fixture
+async def redis_tracked(fake_redis) -> tuple[UploadSessionService, UploadSessionInfo]:
+    """Redisで進捗管理するアップロード中のセッション"""
+    service = UploadSessionService()  # スクリプトをfakeredisに登録する
+    info = make_session_info(TRACKER_REDIS)
+    assert await service.register(info)
+    return service, info
+
+
+async def test_redis_concurrent_chunk_completions_are_counted_once(redis_tracked, fake_redis):
+    service, info = redis_tracked
+
+    # 全チャンクを同時に完了にし、さらに同じチャンクの重複した完了通知も同時に送る
+    indexes = list(range(CHUNK_COUNT)) * 2
+    results = await asyncio.gather(*(
+        service.mark_chunk_uploaded(info, i, f"etag-{i}")
+        for i in indexes
+    ))
+
+    assert all(result is not None for result in results)
+    newly_marked = [i for i, (newly, _) in zip(indexes, results) if newly]
+    assert sorted(newly_marked) == list(range(CHUNK_COUNT))
+
+    # 全チャンクの完了に到達したのは1回だけ
+    completions = [count for newly, count in results if newly and count == CHUNK_COUNT]
+    assert len(completions) == 1
+
+    _, chunk_bitmap, etag_hash = service._keys(info.session_key)
+    assert await fake_redis.bitcount(chunk_bitmap) == CHUNK_COUNT
+    assert await fake_redis.hgetall(etag_hash) == {str(i): f"etag-{i}" for i in range(CHUNK_COUNT)}
+    assert await fake_redis.pttl(chunk_bitmap) > 0
+
+
+async def test_redis_duplicate_mark_does_not_double_count(redis_tracked):
+    service, info = redis_tracked
+
+    first = await service.mark_chunk_uploaded(info, 0, "etag-0")
+    second = await service.mark_chunk_uploaded(info, 0, "etag-0")
+
+    assert first == (True, 1)
+    assert second == (False, 1)
+
+
+async def test_redis_mark_on_inactive_session_returns_none(redis_tracked, fake_redis):
+    service, info = redis_tracked
+    session_hash, _, _ = service._keys(info.session_key)
+
+    await fake_redis.hset(session_hash, "status", "completed")
+    assert await service.mark_chunk_uploaded(info, 0, None) is None
+
+    await fake_redis.delete(session_hash)
+    assert await service.mark_chunk_uploaded(info, 0, None) is None
+
+
+@pytest.fixture
+async def db():
+    try:
+        await prisma.connect()
+    except Exception as e:
+        pytest.skip(f"PostgreSQL is not available: {e}")
+    yield prisma
+    await prisma.disconnect()
+
+
+@pytest.fixture
+async def session(db) -> UploadSessionInfo:
+    """データベースで進捗管理するアップロード中のセッション"""
+    info = make_session_info(TRACKER_DATABASE)
+    file_id = info.file_id
+    await prisma.file.create({
+        "id": file_id,
+        "shareId": security.generate_share_id(),
+        "filename": "test.bin",
+        "size": CHUNK_COUNT * CHUNK_SIZE,
+        "mimeType": "application/octet-stream",
+        "encryptedKey": "",
+        "r2Key": "",
+        "uploadStatus": FileStatus.UPLOADING.value,
+        "chunkCount": CHUNK_COUNT,
+        "uploadedChunks": 0,
+        "expiresAt": info.expires_at + timedelta(days=1)
+    })
+    await prisma.uploadsession.create({
+        "id": info.id,
+        "sessionKey": info.session_key,
+        "fileId": file_id,
+        "status": "active",
+        "expiresAt": info.expires_at,
+        "metadata": json.dumps(info.metadata)
+    })
+    await prisma.filechunk.create_many(data=[
+        {
+            "fileId": file_id,
+            "chunkIndex": i,
+            "size": CHUNK_SIZE,
+            "r2Key": security.generate_r2_key(file_id, i)
+        }
+        for i in range(CHUNK_COUNT)
+    ])
+    yield info
+    await prisma.uploadsession.delete_many(where={"id": info.id})
+    await prisma.file.delete_many(where={"id": file_id})  # チャンクはカスケード削除
+
+
+async def test_concurrent_chunk_completions_are_counted_once(session):
+    # 全チャンクを同時に完了にし、さらに同じチャンクの重複した完了通知も同時に送る
+    indexes = list(range(CHUNK_COUNT)) * 2
+    results = await asyncio.gather(*(
+        upload_session_service.mark_chunk_uploaded(session, i, f"etag-{i}")
+        for i in indexes
+    ))
+
+    assert all(result is not None for result in results)
+    newly_marked = [i for i, (newly, _) in zip(indexes, results) if newly]
+    assert sorted(newly_marked) == list(range(CHUNK_COUNT))
+
+    # 全チャンクの完了に到達したのは1回だけ
+    completions = [count for newly, count in results if newly and count == CHUNK_COUNT]
+    assert len(completions) == 1
+
+    file = await prisma.file.find_unique(where={"id": session.file_id})
+    assert file.uploadedChunks == CHUNK_COUNT
+    assert file.uploadStatus == FileStatus.COMPLETED.value
+
+    chunks = await prisma.filechunk.find_many(where={"fileId": session.file_id})
+    assert len(chunks) == CHUNK_COUNT
+    assert all(chunk.uploadedAt is not None for chunk in chunks)
+    assert {chunk.chunkIndex: chunk.etag for chunk in chunks} == {i: f"etag-{i}" for i in range(CHUNK_COUNT)}
+
+
+async def test_duplicate_mark_does_not_double_count(session):
+    first = await upload_session_service.mark_chunk_uploaded(session, 0, "etag-0")
+    second = await upload_session_service.mark_chunk_uploaded(session, 0, "etag-0")
+
+    assert first == (True, 1)
+    assert second == (False, 1)
+
+    file = await prisma.file.find_unique(where={"id": session.file_id})
+    assert file.uploadedChunks == 1
+    assert file.uploadStatus == FileStatus.UPLOADING.value